@@ -0,0 +1,109 @@
+from collections import OrderedDict
+
+import pygame
+
+TEXT_CACHE_SIZE = 256
+
+
+def scale(image, size):
+    """
+    Callable used to resize a picture, smoothly when it has 24 or 32 bits per pixel.
+    :return: the picture itself when it already has that size
+    :rtype: Surface
+    """
+    size = tuple(size)
+    if image.get_size() == size:
+        return image
+    if image.get_bitsize() in (24, 32):
+        return pygame.transform.smoothscale(image, size)
+    return pygame.transform.scale(image, size)
+
+
+class AssetCache:
+    """
+    Class used to load every picture, atlas and font only once.
+    Rendered text is kept in a least recently used cache keyed by (text, size, colour, font).
+    """
+
+    def __init__(self, text_cache_size=TEXT_CACHE_SIZE):
+        self.images = {}
+        self.atlases = {}
+        self.fonts = {}
+        self.texts = OrderedDict()
+        self.text_cache_size = text_cache_size
+
+    def image(self, path, size=None, alpha=True):
+        """
+        Callable used to get a converted picture, optionally scaled to the given size.
+        :rtype: Surface
+        """
+        key = (path, size, alpha)
+        image = self.images.get(key)
+        if image is None:
+            if size is not None:
+                image = scale(self.image(path, alpha=alpha), size)
+            else:
+                image = pygame.image.load(path)
+                # converting needs a display, before that the picture is kept as it was loaded
+                if pygame.display.get_surface() is not None:
+                    image = image.convert_alpha() if alpha else image.convert()
+            self.images[key] = image
+        return image
+
+    def atlas(self, paths, size=None):
+        """
+        Callable used to pack pictures of the same height side by side in one surface, loaded once per size.
+        :param size: side of the square every picture is scaled to, by default they keep their size
+        :return: the atlas and the area of every picture in it, by path
+        :rtype: tuple
+        """
+        key = (tuple(paths), size)
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            images = [pygame.image.load(path) for path in paths]
+            if size is not None:
+                images = [scale(image, (size, size)) for image in images]
+            surface = pygame.Surface((sum(image.get_width() for image in images),
+                                      max(image.get_height() for image in images)), pygame.SRCALPHA)
+            areas = {}
+            left = 0
+            for path, image in zip(paths, images):
+                # the maximum with a transparent surface copies the pixels and their alpha as they are
+                areas[path] = surface.blit(image, (left, 0), special_flags=pygame.BLEND_RGBA_MAX)
+                left += image.get_width()
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert_alpha()
+            atlas = (surface, areas)
+            self.atlases[key] = atlas
+        return atlas
+
+    def font(self, size, name=None):
+        """
+        Callable used to get the default font or a system font with the given size.
+        :rtype: Font
+        """
+        key = (size, name)
+        font = self.fonts.get(key)
+        if font is None:
+            if name is None:
+                font = pygame.font.Font(pygame.font.get_default_font(), size)
+            else:
+                font = pygame.font.SysFont(name, size)
+            self.fonts[key] = font
+        return font
+
+    def text(self, text, size, colour, name=None):
+        """
+        Callable used to get a rendered text, the least recently used ones are dropped first.
+        :rtype: Surface
+        """
+        key = (text, size, colour, name)
+        surface = self.texts.get(key)
+        if surface is None:
+            surface = self.font(size, name).render(text, True, colour)
+            self.texts[key] = surface
+            if len(self.texts) > self.text_cache_size:
+                self.texts.popitem(last=False)
+        else:
+            self.texts.move_to_end(key)
+        return surface
@@ -0,0 +1,147 @@
+import queue
+import threading
+
+import pygame
+
+# channels the effects are mixed on, a new effect takes the place of a lower priority one when all are busy
+CHANNELS = 8
+DEFAULT_PRIORITY = 0
+
+
+class AudioEngine:
+    """
+    Class used to play the sound effects and the background music without blocking the game.
+    The mixer is opened on the main thread, SDL doesn't promise its subsystems can be started from another one,
+    then a background thread decodes the effects to PCM and loads the music before they are needed
+    and runs the music commands in order so the game never waits for a file.
+    Effects not decoded yet, missing files and a missing sound card are skipped silently.
+    """
+
+    def __init__(self, sounds, music=None, priorities=None, channels=CHANNELS):
+        self.paths = dict(sounds)
+        self.music = music
+        self.priorities = priorities or {}
+        self.number_of_channels = channels
+        self.effects = {}
+        self.channels = []
+        # priority of the effect playing on every channel
+        self.playing = []
+        self.enabled = False
+        self.music_loaded = False
+        self.music_paused = False
+        self.commands = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        """
+        Callable used to open the mixer and load the sounds in the background, it returns once the mixer is open.
+        """
+        if self.thread is None and self.open():
+            self.thread = threading.Thread(target=self.work, name="audio", daemon=True)
+            self.thread.start()
+
+    def open(self):
+        """
+        Callable used to open the mixer and its channels.
+        :return: False if there is no working mixer, the game then runs without sound
+        :rtype: bool
+        """
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            pygame.mixer.set_num_channels(self.number_of_channels)
+        except pygame.error:
+            return False
+        self.playing = [DEFAULT_PRIORITY] * self.number_of_channels
+        self.channels = [pygame.mixer.Channel(i) for i in range(self.number_of_channels)]
+        self.enabled = True
+        return True
+
+    def work(self):
+        """
+        Callable run by the background thread: it loads every sound, then runs the music commands.
+        """
+        for name, path in self.paths.items():
+            try:
+                self.effects[name] = pygame.mixer.Sound(path)
+            except (pygame.error, FileNotFoundError):
+                pass
+        if self.music is not None:
+            try:
+                pygame.mixer.music.load(self.music)
+                self.music_loaded = True
+            except (pygame.error, FileNotFoundError):
+                pass
+        while True:
+            command = self.commands.get()
+            if command is None:
+                return
+            if self.music_loaded:
+                self.run_music(command)
+
+    def run_music(self, command):
+        """
+        Callable used to play, pause or stop the music, a paused music plays on from where it was.
+        """
+        if command == 'play':
+            if self.music_paused:
+                pygame.mixer.music.unpause()
+            else:
+                pygame.mixer.music.play()
+            self.music_paused = False
+        elif command == 'pause':
+            pygame.mixer.music.pause()
+            self.music_paused = True
+        elif command == 'stop':
+            pygame.mixer.music.stop()
+            self.music_paused = False
+
+    def play(self, name):
+        """
+        Callable used to play an effect on a free channel, or instead of the lowest priority effect.
+        :return: the channel or None if the effect was skipped
+        :rtype: Channel
+        """
+        sound = self.effects.get(name)
+        if sound is None:
+            return None
+        priority = self.priorities.get(name, DEFAULT_PRIORITY)
+        chosen = None
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                chosen = i
+                break
+            if self.playing[i] < priority and (chosen is None or self.playing[i] < self.playing[chosen]):
+                chosen = i
+        if chosen is None:
+            return None
+        channel = self.channels[chosen]
+        channel.play(sound)
+        self.playing[chosen] = priority
+        return channel
+
+    def play_music(self):
+        self.send('play')
+
+    def pause_music(self):
+        self.send('pause')
+
+    def stop_music(self):
+        self.send('stop')
+
+    def send(self, command):
+        """
+        Callable used to give a music command to the background thread, they wait there until the music is loaded.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            self.commands.put(command)
+
+    def stop(self):
+        """
+        Callable used to stop the background thread.
+        """
+        if self.thread is not None:
+            self.commands.put(None)
+            self.thread.join()
+            self.thread = None
+            self.enabled = False
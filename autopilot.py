@@ -0,0 +1,278 @@
+import time
+from collections import deque
+
+from engine import DIRECTIONS, OPPOSITE, TranspositionTable
+
+# seconds a move can take, the searches stop and a simpler move is used after it
+TIME_BUDGET = 0.02
+# searches check the clock once every this many visited cells
+CLOCK_EVERY = 256
+
+
+class Autopilot:
+    """
+    Class used to choose the moves of the snake from the game state.
+    It follows a shortest path to the apple if the tail can still be reached after eating it,
+    otherwise it follows a Hamiltonian cycle of the table, chases its tail or goes where there is most room.
+    The planned path is kept between ticks and searched again only when the apple moves or the path is blocked.
+    """
+
+    def __init__(self, state, budget=TIME_BUDGET):
+        self.state = state
+        self.budget = budget
+        cells = state.x * state.y
+        # neighbours of every cell inside the table, by flat index
+        self.neighbours = []
+        for index in range(cells):
+            cell_x, cell_y = divmod(index, state.y)
+            around = []
+            for delta_x, delta_y in DIRECTIONS.values():
+                if 0 <= cell_x + delta_x < state.x and 0 <= cell_y + delta_y < state.y:
+                    around.append((cell_x + delta_x) * state.y + cell_y + delta_y)
+            self.neighbours.append(around)
+        # visited marks are stamped so the arrays are reused by every search without clearing them
+        self.visited = [0] * cells
+        self.parent = [-1] * cells
+        self.stamp = 0
+        self.path = deque()
+        self.path_apple = None
+        self.cycle = self.hamiltonian_cycle()
+        self.deadline = 0.0
+        # ticks without a safe path, after going around the whole table the apple is taken anyway
+        self.stalled = 0
+        # cells chosen by fallback for the states already seen, by their Zobrist hash
+        self.fallbacks = TranspositionTable()
+        # body of the game being played, a reset of the state gives it a new one
+        self.game = state.body
+
+    def hamiltonian_cycle(self):
+        """
+        Callable used to build a cycle going once through every cell, when the table has no rocks and an even side.
+        :return: the next cell of every cell on the cycle, or None
+        :rtype: list
+        """
+        state = self.state
+        if any(state.rocks) or (state.x % 2 and state.y % 2) or min(state.x, state.y) < 2:
+            return None
+        transposed = state.x % 2 == 1
+        columns, rows = (state.y, state.x) if transposed else (state.x, state.y)
+        # down the first column, a serpentine over the other rows and back along the first row
+        order = [(0, row) for row in range(rows)]
+        for column in range(1, columns):
+            serpentine = range(rows - 1, 0, -1) if column % 2 else range(1, rows)
+            order += [(column, row) for row in serpentine]
+        order += [(column, 0) for column in range(columns - 1, 0, -1)]
+        if transposed:
+            order = [(row, column) for column, row in order]
+        cycle = [0] * (state.x * state.y)
+        for position, cell in enumerate(order):
+            following = order[(position + 1) % len(order)]
+            cycle[state.cell_index(cell)] = state.cell_index(following)
+        return cycle
+
+    def out_of_time(self):
+        return time.perf_counter() > self.deadline
+
+    def passable(self, index, tail, neck):
+        """
+        Callable used to test if the head can go on a cell, the tail moves away unless it was just doubled.
+        The neck is never passable, going back on it would turn the snake around.
+        """
+        state = self.state
+        if state.rocks[index] or index == neck:
+            return False
+        occupancy = state.occupancy[index]
+        return occupancy == 0 or (index == tail and occupancy == 1)
+
+    def blocked(self, cells):
+        """
+        Callable used to mark the rocks and the given cells as cells that can't be walked on.
+        :rtype: bytearray
+        """
+        blocked = bytearray(self.state.rocks)
+        for index in cells:
+            blocked[index] = 1
+        return blocked
+
+    def search(self, start, goal, blocked):
+        """
+        Callable used to find a shortest path with a breadth first search.
+        :param blocked: bytearray with 1 on the cells that can't be walked on
+        :return: list of cells from after start to goal, or None if there is none or time ran out
+        :rtype: list
+        """
+        self.stamp += 1
+        stamp = self.stamp
+        visited = self.visited
+        parent = self.parent
+        neighbours = self.neighbours
+        visited[start] = stamp
+        queue = deque([start])
+        seen = 0
+        while queue:
+            current = queue.popleft()
+            if current == goal:
+                path = []
+                while current != start:
+                    path.append(current)
+                    current = parent[current]
+                path.reverse()
+                return path
+            seen += 1
+            if seen % CLOCK_EVERY == 0 and self.out_of_time():
+                return None
+            for following in neighbours[current]:
+                if visited[following] != stamp and (following == goal or not blocked[following]):
+                    visited[following] = stamp
+                    parent[following] = current
+                    queue.append(following)
+        return None
+
+    def area(self, start, blocked):
+        """
+        Callable used to count the cells reachable from a cell.
+        :rtype: int
+        """
+        self.stamp += 1
+        stamp = self.stamp
+        visited = self.visited
+        visited[start] = stamp
+        queue = deque([start])
+        count = 0
+        while queue:
+            current = queue.popleft()
+            count += 1
+            if count % CLOCK_EVERY == 0 and self.out_of_time():
+                break
+            for following in self.neighbours[current]:
+                if visited[following] != stamp and not blocked[following]:
+                    visited[following] = stamp
+                    queue.append(following)
+        return count
+
+    def tail_path(self, body, path):
+        """
+        Callable used to search the path from the head to the tail after the snake followed a path.
+        :param body: cells of the snake from the head
+        :param path: cells walked, a path ending on the apple makes the snake one cell longer
+        :return: list of cells or None if the tail can't be reached
+        :rtype: list
+        """
+        length = len(body)
+        if self.state.apple is not None and path[-1] == self.state.cell_index(self.state.apple):
+            length += 1
+        moved = list(reversed(path)) + body
+        moved = moved[:length]
+        return self.search(moved[0], moved[-1], self.blocked(moved[:-1]))
+
+    def body_blocked(self, tail, body):
+        """
+        Callable used to mark the rocks and the snake as blocked, the tail is free unless it was just doubled
+        or it is the neck.
+        :rtype: bytearray
+        """
+        blocked = self.blocked(body[:-1] if self.state.occupancy[tail] == 1 else body)
+        # at length 2 the neck is also the tail, the head still can't go back on it
+        if len(body) > 1:
+            blocked[body[1]] = 1
+        return blocked
+
+    def plan(self, head, tail, body):
+        """
+        Callable used to search a path to the apple after which the tail can still be reached.
+        :return: list of cells or None
+        :rtype: list
+        """
+        if self.state.apple is None:
+            return None
+        apple = self.state.cell_index(self.state.apple)
+        path = self.search(head, apple, self.body_blocked(tail, body))
+        if path is None:
+            return None
+        if self.tail_path(body, path) is None:
+            self.stalled += 1
+            # an apple in a dead end is never safe, waiting longer would only loop forever
+            if self.stalled <= len(self.neighbours):
+                return None
+        self.stalled = 0
+        return path
+
+    def fallback(self, head, tail, body):
+        """
+        Callable used to choose a cell next to the head when there is no safe path to the apple.
+        The next cell of the Hamiltonian cycle is used if the tail stays reachable from it,
+        otherwise the one with the longest way to the tail, so the body moves out of the way.
+        :rtype: int
+        """
+        blocked = self.body_blocked(tail, body)
+        candidates = [following for following in self.neighbours[head] if not blocked[following]]
+        if self.cycle is not None and self.cycle[head] in candidates \
+                and self.tail_path(body, [self.cycle[head]]) is not None:
+            return self.cycle[head]
+        best = None
+        best_distance = -1
+        for following in candidates:
+            if self.out_of_time():
+                break
+            to_tail = self.tail_path(body, [following])
+            if to_tail is not None and len(to_tail) > best_distance:
+                best, best_distance = following, len(to_tail)
+        if best is not None:
+            return best
+        best_area = -1
+        for following in candidates:
+            room = self.area(following, blocked)
+            if room > best_area:
+                best, best_area = following, room
+        return best
+
+    def direction_to(self, head, following):
+        """
+        Callable used to get the direction going from a cell to the one next to it.
+        :rtype: str
+        """
+        head_x, head_y = divmod(head, self.state.y)
+        following_x, following_y = divmod(following, self.state.y)
+        delta = (following_x - head_x, following_y - head_y)
+        for direction, move in DIRECTIONS.items():
+            if move == delta:
+                return direction
+        return self.state.direction
+
+    def next_turn(self):
+        """
+        Callable used to choose the direction for the next tick.
+        :rtype: str
+        """
+        state = self.state
+        self.deadline = time.perf_counter() + self.budget
+        if state.body is not self.game:
+            # the fallbacks of the finished games give way to the ones of the new game
+            self.game = state.body
+            self.fallbacks.new_age()
+        if not state.is_inside(state.head):
+            return state.direction
+        head = state.cell_index(state.head)
+        tail = state.cell_index(state.body[-1])
+        neck = state.cell_index(state.body[1]) if state.length > 1 else -1
+        # the planned path is used again while it still starts next to the head and the apple didn't move
+        if self.path_apple != state.apple or not self.path or self.path[0] not in self.neighbours[head] \
+                or not self.passable(self.path[0], tail, neck):
+            body = [state.cell_index(cell) for cell in state.body]
+            path = self.plan(head, tail, body)
+            self.path = deque(path or ())
+            self.path_apple = state.apple
+            if not self.path:
+                # a snake without a safe path often comes back to the same state while it waits
+                key = state.zobrist()
+                following = self.fallbacks.get(key)
+                if following is None:
+                    following = self.fallback(head, tail, body)
+                    if following is not None:
+                        self.fallbacks.put(key, following, len(body))
+                if following is None:
+                    return state.direction
+                direction = self.direction_to(head, following)
+                return direction if direction != OPPOSITE[state.direction] else state.direction
+        direction = self.direction_to(head, self.path.popleft())
+        return direction if direction != OPPOSITE[state.direction] else state.direction
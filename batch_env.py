@@ -0,0 +1,119 @@
+import numpy
+
+from engine import DIRECTIONS, DIRECTION_NAMES, OPPOSITE, START_CELL, START_LENGTH
+
+DELTA_X = numpy.array([DIRECTIONS[name][0] for name in DIRECTION_NAMES], dtype=numpy.int32)
+DELTA_Y = numpy.array([DIRECTIONS[name][1] for name in DIRECTION_NAMES], dtype=numpy.int32)
+OPPOSITE_INDEX = numpy.array([DIRECTION_NAMES.index(OPPOSITE[name]) for name in DIRECTION_NAMES], dtype=numpy.int8)
+KEEP_DIRECTION = -1
+
+
+class BatchSnakeEnv:
+    """
+    Class used to run many games with the GameState rules at once.
+    Cells are stored as flat indices (x * Y + y), every game has a ring buffer with its body,
+    an occupancy grid counting the segments on every cell and its own apple.
+    """
+
+    def __init__(self, number_of_games, x, y, obstacles=(), seed=None):
+        self.number_of_games = number_of_games
+        self.x = x
+        self.y = y
+        self.cells = x * y
+        # one extra slot for the duplicated tail added when the snake eats on a full table
+        self.capacity = self.cells + 2
+        self.random = numpy.random.default_rng(seed)
+
+        self.rocks = numpy.zeros(self.cells, dtype=bool)
+        for rock_x, rock_y in obstacles:
+            if 0 <= rock_x < x and 0 <= rock_y < y:
+                self.rocks[rock_x * y + rock_y] = True
+
+        self.body = numpy.zeros((number_of_games, self.capacity), dtype=numpy.int32)
+        self.head_index = numpy.zeros(number_of_games, dtype=numpy.int64)
+        self.length = numpy.zeros(number_of_games, dtype=numpy.int64)
+        self.direction = numpy.zeros(number_of_games, dtype=numpy.int8)
+        self.occupancy = numpy.zeros((number_of_games, self.cells), dtype=numpy.int32)
+        self.apple = numpy.full(number_of_games, -1, dtype=numpy.int64)
+        self.ticks = numpy.zeros(number_of_games, dtype=numpy.int64)
+        self.reset()
+
+    @property
+    def head(self):
+        return self.body[numpy.arange(self.number_of_games), self.head_index]
+
+    def reset(self, games=None):
+        """
+        Callable used to put the snakes of the given games (all of them by default) back at the start.
+        """
+        if games is None:
+            games = numpy.arange(self.number_of_games)
+        games = numpy.asarray(games)
+        if games.size == 0:
+            return
+        start = START_CELL[0] * self.y + START_CELL[1]
+        self.occupancy[games] = 0
+        self.body[games, :START_LENGTH] = start
+        self.head_index[games] = START_LENGTH - 1
+        self.length[games] = START_LENGTH
+        self.occupancy[games, start] = START_LENGTH
+        self.direction[games] = DIRECTION_NAMES.index('down')
+        self.ticks[games] = 0
+        self.generate_apples(games)
+
+    def generate_apples(self, games):
+        """
+        Callable used to pick a random free cell for the apple of every given game.
+        Games without any free cell get -1.
+        """
+        free = (self.occupancy[games] == 0) & ~self.rocks
+        # the free cell with the highest random key is the uniformly picked one
+        keys = self.random.random(free.shape)
+        keys[~free] = -1
+        self.apple[games] = numpy.where(free.any(axis=1), keys.argmax(axis=1), -1)
+
+    def step(self, actions):
+        """
+        Callable used to advance every game by one tick, finished games are reset automatically.
+        :param actions: direction index for every game (see DIRECTION_NAMES), -1 keeps the direction
+        :return: ate, crashed and the length every game had at the end of the tick
+        :rtype: tuple of numpy arrays
+        """
+        actions = numpy.asarray(actions, dtype=numpy.int8)
+        turn = (actions != KEEP_DIRECTION) & (actions != OPPOSITE_INDEX[self.direction])
+        self.direction[turn] = actions[turn]
+
+        games = numpy.arange(self.number_of_games)
+        head = self.body[games, self.head_index]
+        head_x = head // self.y + DELTA_X[self.direction]
+        head_y = head % self.y + DELTA_Y[self.direction]
+        crashed = (head_x < 0) | (head_x >= self.x) | (head_y < 0) | (head_y >= self.y)
+
+        alive = games[~crashed]
+        new_head = head_x[alive] * self.y + head_y[alive]
+
+        # pop the tail before testing the head so the snake can follow its own tail
+        tail = self.body[alive, (self.head_index[alive] - self.length[alive] + 1) % self.capacity]
+        self.occupancy[alive, tail] -= 1
+        crashed[alive] = (self.occupancy[alive, new_head] > 0) | self.rocks[new_head]
+
+        self.head_index[alive] = (self.head_index[alive] + 1) % self.capacity
+        self.body[alive, self.head_index[alive]] = new_head
+        self.occupancy[alive, new_head] += 1
+        self.ticks += 1
+
+        ate = numpy.zeros(self.number_of_games, dtype=bool)
+        ate[alive] = new_head == self.apple[alive]
+        ate &= ~crashed
+        eaters = games[ate]
+        if eaters.size:
+            # the new segment sits on top of the tail and follows it on the next walk
+            new_tail = self.body[eaters, (self.head_index[eaters] - self.length[eaters] + 1) % self.capacity]
+            self.body[eaters, (self.head_index[eaters] - self.length[eaters]) % self.capacity] = new_tail
+            self.occupancy[eaters, new_tail] += 1
+            self.length[eaters] += 1
+            self.generate_apples(eaters)
+
+        length = self.length.copy()
+        self.reset(games[crashed])
+        return ate, crashed, length
@@ -0,0 +1,370 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# the benchmark runs without a window or a sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import main as game
+from autopilot import Autopilot
+from engine import DIRECTIONS, GameState, SnakeBody
+from level import Level, load_level
+
+BOARDS = ['20x20', 'table.json', '200x200']
+# snake lengths as a part of the cells of the board, the start length and a full board included
+LENGTHS = [0.0, 0.25, 0.5, 1.0]
+REPEAT = 5
+# every sample calls the benchmark for at least this many seconds
+MIN_TIME = 0.05
+# a benchmark is reported as slower when its median grew more than this
+TOLERANCE = 0.1
+
+
+def read_board(board):
+    """
+    Callable used to get a level from "XxY" or from a table file.
+    :rtype: Level
+    """
+    size = board.lower().split("x")
+    if len(size) == 2 and size[0].isdigit() and size[1].isdigit():
+        return Level(int(size[0]), int(size[1]))
+    return load_level(board)
+
+
+def make_track(x, y):
+    """
+    Callable used to get an order of every cell of a board without rocks, where each cell is next to the one before.
+    :return: list of cells and whether the last cell is next to the first one
+    :rtype: tuple
+    """
+    state = GameState(x, y)
+    cycle = Autopilot(state).cycle
+    if cycle is not None:
+        track = [0]
+        while len(track) < x * y:
+            track.append(cycle[track[-1]])
+        return [divmod(index, y) for index in track], True
+    track = []
+    for column in range(x):
+        rows = range(y) if column % 2 == 0 else range(y - 1, -1, -1)
+        track += [(column, row) for row in rows]
+    return track, False
+
+
+def direction_between(cell, following):
+    for direction, move in DIRECTIONS.items():
+        if (following[0] - cell[0], following[1] - cell[1]) == move:
+            return direction
+    return None
+
+
+def lay_snake(state, cells):
+    """
+    Callable used to put a snake on the given cells, from the head, without an apple so it never grows.
+    """
+    state.body = SnakeBody(state.capacity)
+    state.occupancy = bytearray(state.x * state.y)
+    state.body_hash = 0
+    state.free = state.table.copy()
+    for cell in cells:
+        state.body.push_tail(cell)
+        state.occupy(cell)
+    if len(cells) > 1:
+        state.direction = direction_between(cells[1], cells[0]) or state.direction
+    state.apple = None
+    state.game_over = False
+
+
+class Walker:
+    """
+    Class used to move a snake of a given length along a track of the whole board for as many ticks as asked.
+    An open track is laid again from its start when the head reaches the end, outside of the timed part.
+    """
+
+    def __init__(self, state, track, closed, length):
+        self.state = state
+        self.track = track
+        self.closed = closed
+        self.length = min(length, len(track) if closed else len(track) - 1)
+        self.turns = [direction_between(track[i], track[(i + 1) % len(track)]) for i in range(len(track))]
+        self.position = 0
+        self.lay()
+
+    def lay(self):
+        self.position = self.length - 1
+        lay_snake(self.state, [self.track[i] for i in range(self.position, -1, -1)])
+
+    def run(self, number, tick):
+        """
+        Callable used to time number ticks, tick is called with the direction to walk.
+        :return: seconds spent in the ticks
+        :rtype: float
+        """
+        turns = self.turns
+        size = len(self.track)
+        seconds = 0.0
+        done = 0
+        while done < number:
+            if self.closed:
+                count = number - done
+            else:
+                count = min(number - done, size - 1 - self.position)
+                if count == 0:
+                    self.lay()
+                    continue
+            start = time.perf_counter()
+            for i in range(self.position, self.position + count):
+                tick(turns[i % size])
+            seconds += time.perf_counter() - start
+            self.position = (self.position + count) % size
+            done += count
+        return seconds
+
+
+class Board:
+    """
+    Class used to prepare one board for the benchmarks: the game window, a game and the snake tracks.
+    Moving benchmarks use the board without its rocks so the snake can go around every cell.
+    """
+
+    def __init__(self, game, name, level):
+        self.game = game
+        self.name = name
+        self.level = level
+        game.LEVEL = level
+        game.X, game.Y = level.x, level.y
+        game.DEFAULT = 0
+        game.set_layout(game.SPRITE_SIZE)
+        self.surface = pygame.display.set_mode((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+        self.play = game.Play(self.surface)
+        self.play.recorder = None
+        self.track, self.closed = make_track(level.x, level.y)
+        self.free_track = [cell for cell in self.track if not level.is_rock(cell)]
+        self.cells = level.x * level.y
+
+    def lengths(self, fractions):
+        """
+        Callable used to turn the length fractions into snake lengths on this board.
+        :rtype: list
+        """
+        return sorted({min(max(2, int(fraction * self.cells)), len(self.free_track)) for fraction in fractions})
+
+    def static_state(self, length):
+        """
+        Callable used to get the game with its rocks and a snake of the given length that doesn't move.
+        :rtype: GameState
+        """
+        state = GameState(self.level.x, self.level.y, level=self.level)
+        cells = self.free_track[:length]
+        lay_snake(state, cells[::-1])
+        state.apple = state.generate_apple()
+        return state
+
+    def walker(self, length):
+        """
+        Callable used to get a snake of the given length walking on the board without rocks.
+        :rtype: Walker
+        """
+        return Walker(GameState(self.level.x, self.level.y), self.track, self.closed, length)
+
+
+def engine_walk(board, length):
+    walker = board.walker(length)
+    state = walker.state
+
+    def tick(direction):
+        state.direction = direction
+        state.walk()
+    return lambda number: walker.run(number, tick)
+
+
+def engine_step(board, length):
+    walker = board.walker(length)
+    state = walker.state
+
+    def tick(direction):
+        state.turn(direction)
+        state.step()
+    return lambda number: walker.run(number, tick)
+
+
+def generate_apple(board, length):
+    state = board.static_state(length)
+    return timed(state.generate_apple)
+
+
+def snake_walk(board, length):
+    walker = board.walker(length)
+    board.play.set_state(walker.state)
+    snake = board.play.snake
+
+    def tick(direction):
+        snake.state.direction = direction
+        snake.walk()
+    return lambda number: walker.run(number, tick)
+
+
+def snake_draw(board, length):
+    board.play.set_state(board.static_state(length))
+    return timed(board.play.snake.draw)
+
+
+def draw_grass(board, length):
+    return timed(lambda: board.game.draw_grass(board.surface, False))
+
+
+def display_score(board, length):
+    board.play.set_state(board.static_state(length))
+    return timed(board.play.display_score)
+
+
+def play_tick(board, length):
+    walker = board.walker(length)
+    board.play.set_state(walker.state)
+    board.play.draw_frame()
+    board.play.redraw = False
+    return lambda number: walker.run(number, board.play.play)
+
+
+def timed(function):
+    """
+    Callable used to time a function without arguments.
+    :return: callable timing number calls
+    """
+    def run(number):
+        start = time.perf_counter()
+        for i in range(number):
+            function()
+        return time.perf_counter() - start
+    return run
+
+
+# name, benchmark and whether it depends on the length of the snake
+BENCHMARKS = [
+    ('engine.walk', engine_walk, True),
+    ('engine.step', engine_step, True),
+    ('engine.generate_apple', generate_apple, True),
+    ('Snake.walk', snake_walk, True),
+    ('Snake.draw', snake_draw, True),
+    ('draw_grass', draw_grass, False),
+    ('Play.display_score', display_score, False),
+    ('Play.play', play_tick, True),
+]
+
+
+def measure(run, repeat=REPEAT, min_time=MIN_TIME):
+    """
+    Callable used to time a benchmark, the number of calls is doubled until a sample lasts min_time.
+    :return: seconds per call of every sample
+    :rtype: list
+    """
+    number = 1
+    while True:
+        seconds = run(number)
+        if seconds >= min_time:
+            break
+        number *= 2
+    return [run(number) / number for i in range(repeat)]
+
+
+def run_benchmarks(game, boards, fractions, selected=None, repeat=REPEAT, min_time=MIN_TIME):
+    """
+    Callable used to run every benchmark on every board and snake length.
+    :return: list of results
+    :rtype: list
+    """
+    results = []
+    for name in boards:
+        board = Board(game, name, read_board(name))
+        for benchmark, function, uses_length in BENCHMARKS:
+            if selected and benchmark not in selected:
+                continue
+            for length in board.lengths(fractions) if uses_length else [2]:
+                samples = measure(function(board, length), repeat, min_time)
+                median = statistics.median(samples)
+                results.append({
+                    "name": benchmark,
+                    "board": name,
+                    "length": length,
+                    "median_ms": median * 1000,
+                    "mean_ms": statistics.mean(samples) * 1000,
+                    "min_ms": min(samples) * 1000,
+                    "stdev_ms": statistics.stdev(samples) * 1000 if len(samples) > 1 else 0.0,
+                    "calls_per_second": 1 / median if median > 0 else 0.0,
+                })
+                print(f"{benchmark:22} {name:12} length {length:6} {median * 1000:10.4f} ms "
+                      f"{results[-1]['calls_per_second']:12.1f}/s", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Callable used to find the benchmarks that got slower than in a previous run.
+    :return: list of (name, board, length, ratio) of the slower benchmarks
+    :rtype: list
+    """
+    old = {(result["name"], result["board"], result["length"]): result["median_ms"]
+           for result in baseline["benchmarks"]}
+    slower = []
+    for result in results:
+        key = (result["name"], result["board"], result["length"])
+        if key in old and old[key] > 0:
+            ratio = result["median_ms"] / old[key]
+            if ratio > 1 + tolerance:
+                slower.append(key + (ratio,))
+    return slower
+
+
+def main(arguments):
+    """
+    Callable used to run the benchmarks from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Time the tick, drawing and apple hot paths.")
+    parser.add_argument("--boards", nargs="+", default=BOARDS, help="XxY sizes or table files")
+    parser.add_argument("--lengths", nargs="+", type=float, default=LENGTHS,
+                        help="snake lengths as a part of the cells of the board")
+    parser.add_argument("--benchmarks", nargs="+", default=None, choices=[name for name, f, l in BENCHMARKS])
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--min-time", type=float, default=MIN_TIME)
+    parser.add_argument("--output", default=None, help="json file for the results, printed by default")
+    parser.add_argument("--compare", default=None, help="json results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    options = parser.parse_args(arguments)
+    pygame.init()
+    results = run_benchmarks(game, options.boards, options.lengths, options.benchmarks, options.repeat,
+                             options.min_time)
+    report = {
+        "metadata": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "sdl": ".".join(map(str, pygame.get_sdl_version())),
+            "platform": platform.platform(),
+            "video_driver": os.environ["SDL_VIDEODRIVER"],
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "benchmarks": results,
+    }
+    text = json.dumps(report, indent=2)
+    if options.output is None:
+        print(text)
+    else:
+        with open(options.output, "w") as f:
+            f.write(text)
+    if options.compare is not None:
+        with open(options.compare) as f:
+            slower = compare(results, json.load(f), options.tolerance)
+        for name, board, length, ratio in slower:
+            print(f"slower: {name} {board} length {length} x{ratio:.2f}", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,547 @@
+import random
+import time
+from collections import deque
+
+# the snake moves one cell per tick in the current direction
+DIRECTIONS = {
+    'up': (0, -1),
+    'down': (0, 1),
+    'left': (-1, 0),
+    'right': (1, 0),
+}
+OPPOSITE = {
+    'up': 'down',
+    'down': 'up',
+    'left': 'right',
+    'right': 'left',
+}
+# index order used by the vectorized environments for their actions
+DIRECTION_NAMES = ['up', 'down', 'left', 'right']
+START_CELL = (1, 1)
+START_LENGTH = 2
+# the score is the number of apples eaten (length - 1) times the multiplier of the difficulty
+SCORE_MULTIPLIERS = {
+    'EASY': 1,
+    'MEDIUM': 2,
+    'HARD': 3,
+    'EXTREME': 5,
+}
+# seed of the random keys of the Zobrist hash, the same state always gets the same hash
+ZOBRIST_SEED = 0x5EED
+# slots of a transposition table when no size is given
+TRANSPOSITION_SIZE = 1 << 16
+# keys of the Zobrist hash already made, by table size
+ZOBRIST_KEYS = {}
+# turns kept between two ticks, more key presses than this are ignored
+INPUT_BUFFER_SIZE = 3
+# number of input to move delays kept to measure the latency
+LATENCY_SAMPLES = 64
+
+
+def compute_score(length, difficulty):
+    """
+    Callable used to compute the score of a snake depending on the difficulty.
+    :rtype: int
+    """
+    if length > 2:
+        return (length - 1) * SCORE_MULTIPLIERS[difficulty]
+    return 1
+
+
+class SnakeBody:
+    """
+    Class used to keep the cells of the snake in a ring buffer, the head is at index 0.
+    Adding a head and removing the tail don't move the other segments.
+    """
+
+    def __init__(self, capacity):
+        self.cells = [None] * capacity
+        self.capacity = capacity
+        self.head_index = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError('segment index out of range')
+        return self.cells[(self.head_index - i) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self.cells[(self.head_index - i) % self.capacity]
+
+    def push_head(self, cell):
+        """
+        Callable used to add a new head in front of the snake.
+        """
+        self.head_index = (self.head_index + 1) % self.capacity
+        self.cells[self.head_index] = cell
+        self.length += 1
+
+    def push_tail(self, cell):
+        """
+        Callable used to add a new segment after the tail.
+        """
+        self.cells[(self.head_index - self.length) % self.capacity] = cell
+        self.length += 1
+
+    def pop_tail(self):
+        """
+        Callable used to remove the tail.
+        :return: the cell of the removed tail
+        :rtype: tuple
+        """
+        cell = self[-1]
+        self.length -= 1
+        return cell
+
+
+class FreeCells:
+    """
+    Class used to keep the free cells of the table in an array together with the position of every cell in it.
+    Removing swaps the last cell into the hole, so adding, removing and sampling are constant time.
+    """
+
+    def __init__(self, size):
+        self.cells = list(range(size))
+        # position of every cell inside cells, -1 when it is taken
+        self.position = list(range(size))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return self.position[cell] != -1
+
+    def add(self, cell):
+        """
+        Callable used to mark a cell as free.
+        """
+        if self.position[cell] == -1:
+            self.position[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def remove(self, cell):
+        """
+        Callable used to mark a cell as taken.
+        """
+        position = self.position[cell]
+        if position == -1:
+            return
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[position] = last
+            self.position[last] = position
+        self.position[cell] = -1
+
+    def copy(self):
+        """
+        Callable used to get an independent copy of the free cells.
+        :rtype: FreeCells
+        """
+        free_cells = FreeCells(0)
+        free_cells.cells = list(self.cells)
+        free_cells.position = list(self.position)
+        return free_cells
+
+    def sample(self, rng):
+        """
+        Callable used to pick a random free cell with the given random generator.
+        :return: the cell or None if the table is full
+        :rtype: int
+        """
+        if not self.cells:
+            return None
+        return self.cells[rng.randrange(len(self.cells))]
+
+
+class ZobristKeys:
+    """
+    Class used to keep the random 64 bit keys of a table size, a state hash is the xor of the keys of its parts:
+    every cell of the snake, its head, its tail, its length, its direction, the apple and the rocks.
+    """
+
+    def __init__(self, x, y, seed=ZOBRIST_SEED):
+        rng = random.Random(f"{seed}:{x}x{y}")
+        cells = x * y
+        self.body = [rng.getrandbits(64) for i in range(cells)]
+        self.head = [rng.getrandbits(64) for i in range(cells)]
+        self.tail = [rng.getrandbits(64) for i in range(cells)]
+        self.apple = [rng.getrandbits(64) for i in range(cells)]
+        self.rock = [rng.getrandbits(64) for i in range(cells)]
+        # the snake is never longer than the capacity of its body
+        self.length = [rng.getrandbits(64) for i in range(cells + 3)]
+        self.direction = {name: rng.getrandbits(64) for name in DIRECTION_NAMES}
+
+
+def zobrist_keys(x, y):
+    """
+    Callable used to get the Zobrist keys of a table size, they are made once per process.
+    :rtype: ZobristKeys
+    """
+    keys = ZOBRIST_KEYS.get((x, y))
+    if keys is None:
+        keys = ZOBRIST_KEYS[(x, y)] = ZobristKeys(x, y)
+    return keys
+
+
+class TranspositionTable:
+    """
+    Class used to remember a value for every state hash in a fixed number of slots, the hash picks the slot.
+    A slot holding another state is replaced when it was stored before the last new_age,
+    or when the new value cost at least as deep a search, so costly values stay until they get old.
+    """
+
+    def __init__(self, size=TRANSPOSITION_SIZE):
+        # a power of two so the slot is the low bits of the hash
+        size = 1 << max(0, size - 1).bit_length()
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.depths = [0] * size
+        self.ages = [0] * size
+        self.age = 0
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.used
+
+    def get(self, key):
+        """
+        Callable used to get the value stored for a hash.
+        :return: the value or None if it isn't stored
+        """
+        slot = key & self.mask
+        if self.keys[slot] == key:
+            self.hits += 1
+            return self.values[slot]
+        self.misses += 1
+        return None
+
+    def put(self, key, value, depth=0):
+        """
+        Callable used to store the value of a hash unless its slot holds a deeper value of the current age.
+        :return: whether the value was stored
+        :rtype: bool
+        """
+        slot = key & self.mask
+        stored = self.keys[slot]
+        if stored is not None and stored != key and self.ages[slot] == self.age and self.depths[slot] > depth:
+            return False
+        if stored is None:
+            self.used += 1
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.depths[slot] = depth
+        self.ages[slot] = self.age
+        return True
+
+    def new_age(self):
+        """
+        Callable used to let every stored value be replaced, like when a new game starts.
+        """
+        self.age += 1
+
+    def clear(self):
+        """
+        Callable used to forget every stored value.
+        """
+        for i in range(len(self.keys)):
+            self.keys[i] = None
+            self.values[i] = None
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+
+class InputBuffer:
+    """
+    Class used to keep the turns pressed between two ticks, one of them is used on every tick.
+    Every turn is checked against the direction the snake really walked, so it can't turn back on itself.
+    """
+
+    def __init__(self, size=INPUT_BUFFER_SIZE):
+        self.size = size
+        self.turns = deque()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def __len__(self):
+        return len(self.turns)
+
+    def clear(self):
+        """
+        Callable used to forget the turns that were not used.
+        """
+        self.turns.clear()
+
+    def push(self, direction, timestamp=None):
+        """
+        Callable used to remember a turn with the moment it was pressed.
+        Repeating the last turn or reversing it does nothing.
+        """
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self.turns:
+            last = self.turns[-1][0]
+            if direction == last or direction == OPPOSITE[last]:
+                return
+        if len(self.turns) < self.size:
+            self.turns.append((direction, timestamp))
+
+    def pop(self, direction, timestamp=None):
+        """
+        Callable used to get the next turn that can be done from the given direction.
+        :return: the new direction or None if there is no turn to do
+        :rtype: str
+        """
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        while self.turns:
+            turn, pressed = self.turns.popleft()
+            if turn != direction and turn != OPPOSITE[direction]:
+                self.latencies.append(timestamp - pressed)
+                return turn
+        return None
+
+    def latency(self):
+        """
+        Callable used to get the average time in seconds between a key press and the move it made.
+        :rtype: float
+        """
+        if not self.latencies:
+            return 0.0
+        return sum(self.latencies) / len(self.latencies)
+
+
+class GameState:
+    """
+    Class used to hold the game rules without any rendering.
+    All positions are in cells, the renderers multiply them by SIZE.
+    """
+
+    def __init__(self, x, y, obstacles=(), length=START_LENGTH, seed=None, level=None):
+        self.x = x
+        self.y = y
+        self.start_length = length
+        self.random = random.Random(seed)
+        self.keys = zobrist_keys(x, y)
+        # xor of the keys of the cells with a rock, and of the cells with at least one snake segment
+        self.rocks_hash = 0
+        self.body_hash = 0
+        if level is not None:
+            # the level already knows its obstacle bitmap and free cells, in the order add_rock leaves them
+            self.table = level.free_cells().copy()
+            self.rocks = bytearray(level.bitmap)
+            for rock_x, rock_y in level.obstacles:
+                self.rocks_hash ^= self.keys.rock[self.cell_index((rock_x, rock_y))]
+        else:
+            # free cells of the empty table, copied for every new game
+            self.table = FreeCells(x * y)
+            # 1 on every cell with an obstacle, indexed by cell_index
+            self.rocks = bytearray(x * y)
+        self.free = self.table
+        for rock_x, rock_y in obstacles:
+            self.add_rock((rock_x, rock_y))
+        # one extra slot for the duplicated tail added when the snake eats on a full table
+        self.capacity = x * y + 2
+        self.body = SnakeBody(self.capacity)
+        # number of snake segments on every cell, indexed by cell_index
+        self.occupancy = bytearray(x * y)
+        self.direction = 'down'
+        self.apple = None
+        self.game_over = False
+        self.reset()
+
+    @property
+    def length(self):
+        return len(self.body)
+
+    @property
+    def head(self):
+        return self.body[0]
+
+    def cell_index(self, cell):
+        """
+        Callable used to get the position of a cell inside the occupancy.
+        :rtype: int
+        """
+        return cell[0] * self.y + cell[1]
+
+    def is_inside(self, cell):
+        """
+        Callable used to test if a cell is inside the table.
+        """
+        return 0 <= cell[0] < self.x and 0 <= cell[1] < self.y
+
+    def reset(self, seed=None):
+        """
+        Callable used to put the snake back at the start and respawn the apple.
+        A seed starts a new random stream, so the same seed and turns always give the same game.
+        """
+        if seed is not None:
+            self.random.seed(seed)
+        self.body = SnakeBody(self.capacity)
+        self.occupancy = bytearray(self.x * self.y)
+        self.body_hash = 0
+        self.free = self.table.copy()
+        for i in range(self.start_length):
+            self.body.push_tail(START_CELL)
+            self.occupy(START_CELL)
+        self.direction = 'down'
+        self.game_over = False
+        self.apple = self.generate_apple()
+
+    def add_rock(self, cell):
+        """
+        Callable used to add an obstacle to the table.
+        """
+        if self.is_inside(cell):
+            if not self.rocks[self.cell_index(cell)]:
+                self.rocks_hash ^= self.keys.rock[self.cell_index(cell)]
+            self.rocks[self.cell_index(cell)] = 1
+            self.table.remove(self.cell_index(cell))
+            if self.free is not self.table:
+                self.free.remove(self.cell_index(cell))
+
+    def occupy(self, cell):
+        """
+        Callable used to count a new snake segment on a cell.
+        """
+        index = self.cell_index(cell)
+        self.occupancy[index] += 1
+        if self.occupancy[index] == 1:
+            self.free.remove(index)
+            self.body_hash ^= self.keys.body[index]
+
+    def leave(self, cell):
+        """
+        Callable used to remove a snake segment from a cell.
+        """
+        index = self.cell_index(cell)
+        self.occupancy[index] -= 1
+        if self.occupancy[index] == 0:
+            self.body_hash ^= self.keys.body[index]
+            if not self.rocks[index]:
+                self.free.add(index)
+
+    def zobrist(self):
+        """
+        Callable used to get the 64 bit Zobrist hash of the state.
+        The snake cells are kept up to date while it moves, the head, tail, length, direction and apple
+        are single keys added here, so two states with the same hash are the same state
+        unless the snake took another order through the same cells.
+        :rtype: int
+        """
+        keys = self.keys
+        value = self.body_hash ^ self.rocks_hash ^ keys.length[len(self.body)] ^ keys.direction[self.direction]
+        if self.body.length:
+            head = self.body[0]
+            if self.is_inside(head):
+                value ^= keys.head[head[0] * self.y + head[1]]
+            tail = self.body[-1]
+            if self.is_inside(tail):
+                value ^= keys.tail[tail[0] * self.y + tail[1]]
+        if self.apple is not None:
+            value ^= keys.apple[self.apple[0] * self.y + self.apple[1]]
+        return value
+
+    def compute_zobrist(self):
+        """
+        Callable used to compute the Zobrist hash again from every cell, to check the one kept up to date.
+        :rtype: int
+        """
+        keys = self.keys
+        body_hash = 0
+        rocks_hash = 0
+        for index in range(self.x * self.y):
+            if self.occupancy[index]:
+                body_hash ^= keys.body[index]
+            if self.rocks[index]:
+                rocks_hash ^= keys.rock[index]
+        return self.zobrist() ^ self.body_hash ^ self.rocks_hash ^ body_hash ^ rocks_hash
+
+    def turn(self, direction):
+        """
+        Callable used to change the direction of the snake, it can't turn back on itself.
+        """
+        if self.direction != OPPOSITE[direction]:
+            self.direction = direction
+
+    def is_free(self, cell):
+        """
+        Callable used to test if a cell is inside the table and not taken by a rock or the snake.
+        """
+        if not self.is_inside(cell):
+            return False
+        index = self.cell_index(cell)
+        return self.occupancy[index] == 0 and not self.rocks[index]
+
+    def generate_apple(self):
+        """
+        Callable used to pick a random free cell for the apple.
+        :return: the cell or None if the table is full
+        :rtype: tuple
+        """
+        index = self.free.sample(self.random)
+        if index is None:
+            return None
+        return index // self.y, index % self.y
+
+    def walk(self):
+        """
+        Callable used to move every segment of the snake one cell forward.
+        """
+        tail = self.body.pop_tail()
+        self.leave(tail)
+        delta_x, delta_y = DIRECTIONS[self.direction]
+        head_x, head_y = self.body[0] if self.body.length else tail
+        head = (head_x + delta_x, head_y + delta_y)
+        self.body.push_head(head)
+        # a head outside of the table is a crash and is never looked up
+        if self.is_inside(head):
+            self.occupy(head)
+
+    def increase_length(self):
+        """
+        Callable used to grow the snake, the new segment follows the tail on the next walk.
+        """
+        tail = self.body[-1]
+        self.body.push_tail(tail)
+        self.occupy(tail)
+
+    def is_crash(self):
+        """
+        Callable used to test if the head hit itself, the border of the table or a rock.
+        """
+        head = self.body[0]
+        if not self.is_inside(head):
+            return True
+        # the head itself is counted on its cell, a second segment there means it bit itself
+        if self.occupancy[self.cell_index(head)] > 1:
+            return True
+        return self.rocks[self.cell_index(head)] == 1
+
+    def step(self):
+        """
+        Callable used to advance the game by one tick.
+        :return: 'eat_apple', 'crash' or None, named like the sounds in play_sound
+        :rtype: str
+        """
+        if self.game_over:
+            return 'crash'
+        self.walk()
+        event = None
+        if self.body[0] == self.apple:
+            event = 'eat_apple'
+            self.increase_length()
+            self.apple = self.generate_apple()
+        if self.is_crash():
+            self.game_over = True
+            event = 'crash'
+        return event
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import DIRECTIONS, START_CELL
+
+# part of the cells with a rock when none is given
+DENSITY = 0.1
+CHUNK_SIZE = 8
+# cells around a cell in the order of a walk around it, every cell is next to the one before and after it
+RING = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+# places of the four cells next to the cell inside the ring
+SIDES = (0, 2, 4, 6)
+
+
+def keeps_connected(ring):
+    """
+    Callable used to test if a rock can be put on a cell without cutting the free cells around it apart.
+    It is true when the free cells next to the cell are joined by free cells around it,
+    so every path going through the cell can go around it instead.
+    :param ring: bitmask of the free cells around the cell, in the order of RING
+    :rtype: bool
+    """
+    runs = []
+    for i in range(8):
+        if ring >> i & 1:
+            if i > 0 and ring >> (i - 1) & 1:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+    # the walk around the cell is a circle, the last run goes on into the first one
+    if len(runs) > 1 and ring & 1 and ring >> 7 & 1:
+        runs[0] += runs.pop()
+    return sum(1 for run in runs if any(i in SIDES for i in run)) <= 1
+
+
+# whether a rock keeps the table connected, for every bitmask of the free cells around a cell
+SAFE_RINGS = [keeps_connected(ring) for ring in range(256)]
+
+
+def protected_cells(x, y):
+    """
+    Callable used to get the cells that never get a rock: the start of the snake and the cell of its first move.
+    :rtype: set
+    """
+    cells = set()
+    for cell_x, cell_y in (START_CELL, (START_CELL[0] + DIRECTIONS['down'][0], START_CELL[1] + DIRECTIONS['down'][1])):
+        if 0 <= cell_x < x and 0 <= cell_y < y:
+            cells.add((cell_x, cell_y))
+    return cells
+
+
+def generate(x, y, density=DENSITY, seed=None):
+    """
+    Callable used to put rocks on random cells of a table, every free cell can still be reached from the start.
+    The cells are tried once in a random order and a rock is kept only if the free cells around it stay joined,
+    so no table is ever thrown away. Densities above about 0.4 can't be reached, fewer rocks are put then.
+    :return: list of rock cells
+    :rtype: list
+    """
+    rng = random.Random(seed)
+    target = round(density * x * y)
+    # free cells with a border of rocks around the table, indexed by (x + 2) * (row + 1) + column + 1
+    width = x + 2
+    free = bytearray(width * (y + 2))
+    for row in range(y):
+        free[width * (row + 1) + 1:width * (row + 1) + 1 + x] = b"\x01" * x
+    offsets = [delta_y * width + delta_x for delta_x, delta_y in RING]
+    protected = protected_cells(x, y)
+    cells = [(cell_x, cell_y) for cell_x in range(x) for cell_y in range(y) if (cell_x, cell_y) not in protected]
+    rng.shuffle(cells)
+    rocks = []
+    for cell_x, cell_y in cells:
+        if len(rocks) >= target:
+            break
+        index = width * (cell_y + 1) + cell_x + 1
+        ring = 0
+        for bit, offset in enumerate(offsets):
+            ring |= free[index + offset] << bit
+        if SAFE_RINGS[ring]:
+            free[index] = 0
+            rocks.append((cell_x, cell_y))
+    return rocks
+
+
+def is_connected(x, y, rocks, start=START_CELL):
+    """
+    Callable used to flood fill the table from the start and test that every free cell was reached.
+    :rtype: bool
+    """
+    blocked = bytearray(x * y)
+    for cell_x, cell_y in rocks:
+        blocked[cell_x * y + cell_y] = 1
+    start_index = start[0] * y + start[1]
+    if not (0 <= start[0] < x and 0 <= start[1] < y) or blocked[start_index]:
+        return False
+    blocked[start_index] = 1
+    reached = 1
+    queue = deque([start])
+    while queue:
+        cell_x, cell_y = queue.popleft()
+        for delta_x, delta_y in DIRECTIONS.values():
+            next_x, next_y = cell_x + delta_x, cell_y + delta_y
+            if 0 <= next_x < x and 0 <= next_y < y and not blocked[next_x * y + next_y]:
+                blocked[next_x * y + next_y] = 1
+                reached += 1
+                queue.append((next_x, next_y))
+    return reached == x * y - len(set(rocks))
+
+
+def table_name(x, y, density, seed):
+    return f"{x}x{y}-{density:g}-{seed}.json"
+
+
+def write_table(path, x, y, rocks):
+    """
+    Callable used to write a table json in the format of table.json.
+    """
+    with open(path, "w") as f:
+        json.dump({"x": x, "y": y, "obstacle_list": [list(cell) for cell in rocks]}, f)
+
+
+def generate_chunk(folder, x, y, density, seeds, verify=False):
+    """
+    Callable used by the worker processes to generate and write the tables of some seeds.
+    :return: list of (path, number of rocks)
+    :rtype: list
+    """
+    written = []
+    for seed in seeds:
+        rocks = generate(x, y, density, seed)
+        if verify and not is_connected(x, y, rocks):
+            raise RuntimeError(f"table {x}x{y} of seed {seed} is not connected")
+        path = os.path.join(folder, table_name(x, y, density, seed))
+        write_table(path, x, y, rocks)
+        written.append((path, len(rocks)))
+    return written
+
+
+def generate_batch(folder, x, y, density, seeds, workers=None, chunk_size=CHUNK_SIZE, verify=False):
+    """
+    Callable used to generate the tables of many seeds over several processes.
+    :return: list of (path, number of rocks) in the order of the seeds
+    :rtype: list
+    """
+    os.makedirs(folder, exist_ok=True)
+    seeds = list(seeds)
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(generate_chunk, folder, x, y, density, chunk, verify) for chunk in chunks]
+        for future in futures:
+            written += future.result()
+    return written
+
+
+def main(arguments):
+    """
+    Callable used to generate tables from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Generate table json files where every free cell can be reached.")
+    parser.add_argument("x", type=int)
+    parser.add_argument("y", type=int)
+    parser.add_argument("--density", type=float, default=DENSITY, help="part of the cells with a rock")
+    parser.add_argument("--seeds", type=int, default=1, help="number of tables")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--output", default="levels", help="folder of the table files")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--verify", action="store_true", help="flood fill every table to check it")
+    options = parser.parse_args(arguments)
+    if min(options.x, options.y) <= max(START_CELL) or not 0 <= options.density < 1:
+        parser.error("the table must be larger than the start cell and the density must be in [0, 1)")
+    start = time.perf_counter()
+    written = generate_batch(options.output, options.x, options.y, options.density,
+                             range(options.first_seed, options.first_seed + options.seeds), options.workers,
+                             options.chunk_size, options.verify)
+    seconds = time.perf_counter() - start
+    cells = options.x * options.y
+    short = sum(1 for path, rocks in written if rocks < round(options.density * cells))
+    print(f"{len(written)} tables in {seconds:.2f} s, mean density "
+          f"{sum(rocks for path, rocks in written) / max(len(written), 1) / cells:.3f}, "
+          f"{short} with fewer rocks than asked", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,156 @@
+import bisect
+import json
+import os
+
+LEADERBOARD_FILE = "leaderboards"
+# best scores kept in memory and in the index for every difficulty and table
+KEEP_SCORES = 100
+# the index is written again after this many new scores
+INDEX_EVERY = 20
+# difficulty and table of the old "name score" lines
+UNKNOWN = '-'
+
+
+class Leaderboard:
+    """
+    Class used to keep the scores of every difficulty and table.
+    Every score is appended to a log file with one "name score difficulty table" line.
+    The best scores of every partition are kept sorted in memory and written to an index file
+    together with how much of the log they cover, so loading only reads the lines added after it.
+    """
+
+    def __init__(self, path=LEADERBOARD_FILE, keep=KEEP_SCORES):
+        self.path = path
+        self.index_path = path + ".index"
+        self.keep = keep
+        # partition -> sorted list of (-score, number, name), number keeps the first score first on ties
+        self.partitions = {}
+        self.counts = {}
+        self.number = 0
+        self.offset = 0
+        self.unsaved = 0
+        self.load()
+
+    @staticmethod
+    def partition(difficulty, table):
+        return f"{difficulty} {table}"
+
+    def load(self):
+        """
+        Callable used to read the index and the lines of the log written after it.
+        """
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = None
+            if index is not None and index["offset"] <= size:
+                self.offset = index["offset"]
+                self.number = index["number"]
+                self.counts = index["counts"]
+                for partition, scores in index["partitions"].items():
+                    self.partitions[partition] = [tuple(score) for score in scores]
+        if size > self.offset:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                for line in f.read().decode().splitlines():
+                    self.parse(line)
+            self.offset = size
+            self.save_index()
+
+    def parse(self, line):
+        """
+        Callable used to add one line of the log to the memory.
+        """
+        fields = line.split()
+        if len(fields) == 2:
+            fields += [UNKNOWN, UNKNOWN]
+        if len(fields) != 4 or not fields[1].lstrip('-').isdigit():
+            return
+        name, score, difficulty, table = fields
+        self.insert(name, int(score), self.partition(difficulty, table))
+
+    def insert(self, name, score, partition):
+        """
+        Callable used to add a score to the sorted scores of its partition.
+        :return: the rank of the score starting from 1, or None if it is not kept
+        :rtype: int
+        """
+        self.number += 1
+        self.counts[partition] = self.counts.get(partition, 0) + 1
+        scores = self.partitions.setdefault(partition, [])
+        entry = (-score, self.number, name)
+        position = bisect.bisect(scores, entry)
+        if position >= self.keep:
+            return None
+        scores.insert(position, entry)
+        del scores[self.keep:]
+        return position + 1
+
+    def add(self, name, score, difficulty, table):
+        """
+        Callable used to save a new score.
+        :return: the rank of the score starting from 1, or None if it is not in the kept best scores
+        :rtype: int
+        """
+        name = "_".join(name.split()) or "Player"
+        line = f"{name} {score} {difficulty} {table}\n".encode()
+        with open(self.path, "ab+") as f:
+            # the old file can end without a new line
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+        rank = self.insert(name, score, self.partition(difficulty, table))
+        self.unsaved += 1
+        if self.unsaved >= INDEX_EVERY:
+            self.save_index()
+        return rank
+
+    def save_index(self):
+        """
+        Callable used to write the index to a temporary file and move it over the old one.
+        """
+        index = {
+            "offset": self.offset,
+            "number": self.number,
+            "counts": self.counts,
+            "partitions": self.partitions,
+        }
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.index_path)
+        self.unsaved = 0
+
+    def top(self, k, difficulty, table):
+        """
+        Callable used to get the k best scores of a difficulty and table.
+        :return: list of (name, score)
+        :rtype: list
+        """
+        scores = self.partitions.get(self.partition(difficulty, table), [])
+        return [(name, -score) for score, number, name in scores[:k]]
+
+    def high_score(self, difficulty, table):
+        """
+        Callable used to get the best score of a difficulty and table, 0 if there is none.
+        :rtype: int
+        """
+        best = self.top(1, difficulty, table)
+        return best[0][1] if best else 0
+
+    def count(self, difficulty, table):
+        """
+        Callable used to get how many scores were saved for a difficulty and table.
+        :rtype: int
+        """
+        return self.counts.get(self.partition(difficulty, table), 0)
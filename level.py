@@ -0,0 +1,258 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from engine import FreeCells
+
+# size of the table when the obstacle file doesn't have one
+DEFAULT_X = 20
+DEFAULT_Y = 20
+# folder of the compiled levels, an empty SNAKE_LEVEL_CACHE reads the table files every time
+CACHE_DIR = os.environ.get("SNAKE_LEVEL_CACHE", ".level_cache")
+# the least recently used compiled levels are removed above this number
+CACHE_ENTRIES = 4096
+COMPILED_EXTENSION = ".lvl"
+# magic, version, x, y, number of rocks, number of free cells, hash of the table file
+COMPILED_HEADER = struct.Struct("<4sIIIII32s")
+COMPILED_MAGIC = b"SNKL"
+COMPILED_VERSION = 1
+# the eight cells of every byte of the packed bitmap, lowest bit first
+UNPACKED_BYTES = [bytes((byte >> bit) & 1 for bit in range(8)) for byte in range(256)]
+
+
+class Level:
+    """
+    Class used to keep a table: its size and the cells with obstacles.
+    The obstacles are marked in a bitmap indexed like the game occupancy (x * Y + y),
+    obstacles outside of the table are dropped.
+    """
+
+    def __init__(self, x=DEFAULT_X, y=DEFAULT_Y, obstacles=(), digest=None):
+        self.x = x
+        self.y = y
+        self.bitmap = bytearray(x * y)
+        self.obstacles = []
+        # hash of the file the level was read from, the same as an empty file by default
+        self.hash = digest if digest is not None else hashlib.sha256(b'').digest()
+        # free cells of the table without the snake, computed once when first asked
+        self.free = None
+        self.add_rocks(obstacles)
+
+    def add_rock(self, cell):
+        """
+        Callable used to add an obstacle to the table.
+        """
+        cell_x, cell_y = cell
+        if 0 <= cell_x < self.x and 0 <= cell_y < self.y and not self.bitmap[cell_x * self.y + cell_y]:
+            self.bitmap[cell_x * self.y + cell_y] = 1
+            self.obstacles.append((cell_x, cell_y))
+            self.free = None
+
+    def add_rocks(self, cells):
+        """
+        Callable used to add every obstacle from an iterable of [x, y].
+        """
+        for cell in cells:
+            self.add_rock((int(cell[0]), int(cell[1])))
+
+    def is_rock(self, cell):
+        """
+        Callable used to test if there is an obstacle on a cell.
+        """
+        cell_x, cell_y = cell
+        return 0 <= cell_x < self.x and 0 <= cell_y < self.y and self.bitmap[cell_x * self.y + cell_y] == 1
+
+    def free_cells(self):
+        """
+        Callable used to get the free cells of the table, in the same order a GameState adding the rocks has them.
+        :rtype: FreeCells
+        """
+        if self.free is None:
+            self.free = FreeCells(self.x * self.y)
+            for cell_x, cell_y in self.obstacles:
+                self.free.remove(cell_x * self.y + cell_y)
+        return self.free
+
+
+def load_table(path):
+    """
+    Callable used to read a table json with "x", "y" and "obstacle_list".
+    :rtype: Level
+    """
+    with open(path, "rb") as f:
+        table = f.read()
+    data = json.loads(table)
+    return Level(data["x"], data["y"], data.get("obstacle_list", ()), hashlib.sha256(table).digest())
+
+
+def read_positions(f, digest):
+    """
+    Callable used to read "x y" lines one by one, the bytes are added to the hash while reading.
+    :return: generator of (x, y)
+    """
+    for line in f:
+        digest.update(line)
+        fields = line.replace(b",", b" ").split()
+        if len(fields) >= 2:
+            yield int(fields[0]), int(fields[1])
+
+
+def load_positions(path, x=DEFAULT_X, y=DEFAULT_Y):
+    """
+    Callable used to read an obstacle file with one "x y" cell per line, like trees_position.txt.
+    :rtype: Level
+    """
+    digest = hashlib.sha256()
+    level = Level(x, y)
+    with open(path, "rb") as f:
+        level.add_rocks(read_positions(f, digest))
+    level.hash = digest.digest()
+    return level
+
+
+def load_source(path, x=DEFAULT_X, y=DEFAULT_Y):
+    """
+    Callable used to read a table json or an obstacle file, the size is used only for obstacle files.
+    :rtype: Level
+    """
+    if path.endswith(".json"):
+        return load_table(path)
+    return load_positions(path, x, y)
+
+
+def compile_level(level):
+    """
+    Callable used to turn a level into the bytes of a compiled level: the header, the packed obstacle bitmap,
+    the obstacles in the order they were read, the free cells and the position of every cell among them.
+    :rtype: bytes
+    """
+    size = level.x * level.y
+    packed = bytearray((size + 31) // 32 * 4)
+    for i in range(0, size, 8):
+        byte = 0
+        for bit, rock in enumerate(level.bitmap[i:i + 8]):
+            byte |= rock << bit
+        packed[i // 8] = byte
+    free = level.free_cells()
+    obstacles = array("i", [cell_x * level.y + cell_y for cell_x, cell_y in level.obstacles])
+    header = COMPILED_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, level.x, level.y, len(obstacles),
+                                  len(free), level.hash)
+    return b"".join([header, packed, obstacles.tobytes(), array("i", free.cells).tobytes(),
+                     array("i", free.position).tobytes()])
+
+
+def read_compiled(data, digest=None):
+    """
+    Callable used to read a compiled level from a buffer, like a memory mapped file.
+    :return: the level or None if the buffer is not a compiled level of this version or of this hash
+    :rtype: Level
+    """
+    if len(data) < COMPILED_HEADER.size:
+        return None
+    magic, version, x, y, rocks, free, table_hash = COMPILED_HEADER.unpack_from(data)
+    size = x * y
+    packed_size = (size + 31) // 32 * 4
+    if magic != COMPILED_MAGIC or version != COMPILED_VERSION or (digest is not None and table_hash != digest):
+        return None
+    if len(data) != COMPILED_HEADER.size + packed_size + 4 * (rocks + free + size):
+        return None
+    view = memoryview(data)
+    offset = COMPILED_HEADER.size
+    level = Level(x, y, digest=table_hash)
+    level.bitmap = bytearray(b"".join(map(UNPACKED_BYTES.__getitem__, view[offset:offset + packed_size]))[:size])
+    offset += packed_size
+    cells = view[offset:offset + 4 * rocks].cast("i").tolist()
+    level.obstacles = [divmod(cell, y) for cell in cells]
+    offset += 4 * rocks
+    level.free = FreeCells(0)
+    level.free.cells = view[offset:offset + 4 * free].cast("i").tolist()
+    offset += 4 * free
+    level.free.position = view[offset:offset + 4 * size].cast("i").tolist()
+    view.release()
+    return level
+
+
+def compiled_path(cache_dir, digest, path, x, y):
+    """
+    Callable used to get the file of a compiled level, obstacle files are compiled once per table size.
+    :rtype: str
+    """
+    name = digest.hex() if path.endswith(".json") else f"{digest.hex()}-{x}x{y}"
+    return os.path.join(cache_dir, name + COMPILED_EXTENSION)
+
+
+def map_compiled(path, digest):
+    """
+    Callable used to read a compiled level through a memory map.
+    :return: the level or None if the file is missing or not usable
+    :rtype: Level
+    """
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return read_compiled(data, digest)
+    except (OSError, ValueError):
+        return None
+
+
+def write_compiled(path, level):
+    """
+    Callable used to write a compiled level to a temporary file and move it in place,
+    so games loading the same level at the same time never read half a file.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(compile_level(level))
+    os.replace(temporary, path)
+
+
+def evict(cache_dir, entries=CACHE_ENTRIES):
+    """
+    Callable used to remove the least recently used compiled levels above the given number.
+    """
+    try:
+        files = [entry for entry in os.scandir(cache_dir) if entry.name.endswith(COMPILED_EXTENSION)]
+    except OSError:
+        return
+    if len(files) <= entries:
+        return
+    files.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in files[:len(files) - entries]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def load_level(path, x=DEFAULT_X, y=DEFAULT_Y, cache_dir=CACHE_DIR):
+    """
+    Callable used to read a table json or an obstacle file through the cache of compiled levels.
+    The file is always read and hashed to find its compiled level, it is parsed and compiled only when
+    the cache doesn't have it.
+    A compiled level that can't be used is compiled again, the ones not used for long are evicted.
+    :rtype: Level
+    """
+    if not cache_dir:
+        return load_source(path, x, y)
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).digest()
+    cached = compiled_path(cache_dir, digest, path, x, y)
+    level = map_compiled(cached, digest)
+    if level is not None and (path.endswith(".json") or (level.x, level.y) == (x, y)):
+        try:
+            # the modification time orders the compiled levels for the eviction
+            os.utime(cached)
+        except OSError:
+            pass
+        return level
+    level = load_source(path, x, y)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_compiled(cached, level)
+    except OSError:
+        return level
+    evict(cache_dir)
+    return level
@@ -1,58 +1,241 @@
 import json
+import os
+import struct
 import sys
+import time
+
+# startup is timed from here, before pygame is imported
+STARTED = time.perf_counter()
 
 import pygame
 from pygame.locals import *
-import time
 import random
-import numpy
 
-# variable used to test if the program got any argument
+from assets import AssetCache
+from audio import AudioEngine
+from autopilot import Autopilot
+from engine import DIRECTIONS, SCORE_MULTIPLIERS, GameState, InputBuffer, compute_score
+from leaderboard import Leaderboard
+from level import Level, load_level
+from profiler import FrameProfiler, NullProfiler
+from replay import REPLAY_EXTENSION, Recorder, Replay
+
+# replay file given on the command line, watched before the menu opens
+REPLAY_FILE = None
+# variable used to test if the program got any argument, a table json or an obstacle file
 DEFAULT = 1
-if len(sys.argv) == 2:
-    DEFAULT = 0
-    f = open(sys.argv[1], "r")
-    data = json.loads(f.read())
-    X = data["x"]
-    Y = data["y"]
-else:
-    X = 20
-    Y = 20
-SIZE = 40
+# the empty table until configure reads the one given on the command line
+LEVEL = Level()
+X = LEVEL.x
+Y = LEVEL.y
+# size of the pictures, cells are drawn at this size when the table fits on the screen
+SPRITE_SIZE = 40
+# size of a cell in pixels, smaller when a large table is fitted to the screen
+SIZE = SPRITE_SIZE
+# smallest cell size a table is fitted with
+MIN_SIZE = 4
+# part of the screen the window can take, the rest is left for the title bar and the task bar
+SCREEN_FILL = 0.9
+# forces the cell size instead of fitting the table to the screen
+CELL_SIZE = os.environ.get("SNAKE_CELL_SIZE")
 BACKGROUND_COLOR = (0, 230, 0)
 GRASS_COLOR = (0, 179, 0)
 SCREEN_WIDTH = SIZE * X
 SCREEN_HEIGHT = SIZE * Y
-CURRENT_HIGH_SCORE = 0
+# the leaderboard is read the first time a game ends
+LEADERBOARD = None
+PLAYER_NAME = os.environ.get("SNAKE_PLAYER", "Player")
 LETTER_COLOUR = (204, 0, 0)
 FONT_SIZE = X + Y
 NIGHT_MODE = False
 NIGHT_MODE_BACKGROUND_COLOR = (111, 104, 104)
 NIGHT_MODE_GRASS_COLOR = (30, 29, 29)
 MUTED = False
+SOUNDS = {
+    'eat_apple': "resource/Minecraft Eating - Sound Effect (HD).mp3",
+    'crash': "resource/video game over sound effect.mp3",
+}
+# a sound with a higher priority is played instead of a lower one when every channel is busy
+SOUND_PRIORITIES = {
+    'eat_apple': 1,
+    'crash': 2,
+}
+MUSIC_FILE = "resource/Theme (30 minutes).mp3"
+BACKGROUND_PICTURE = "resource/snake_background.png"
+REPLAY_DIRECTORY = "replays"
+# ticks skipped by the left and right arrows while watching a replay
+SEEK_TICKS = 50
+# every picture, font and rendered text is loaded through this cache
+ASSETS = AssetCache()
+# the sounds are decoded and the music is loaded in the background when the menu opens
+AUDIO = AudioEngine(SOUNDS, MUSIC_FILE, SOUND_PRIORITIES)
+# pictures of the snake, packed in one atlas
+SPRITE_FILES = [
+    'Graphics/head_up.png', 'Graphics/head_down.png', 'Graphics/head_left.png', 'Graphics/head_right.png',
+    'Graphics/tail_up.png', 'Graphics/tail_down.png', 'Graphics/tail_left.png', 'Graphics/tail_right.png',
+    'Graphics/body_vertical.png', 'Graphics/body_horizontal.png',
+    'Graphics/body_tr.png', 'Graphics/body_tl.png', 'Graphics/body_br.png', 'Graphics/body_bl.png',
+]
+# side of a cell another cell is on, by their difference
+SIDES = {move: direction for direction, move in DIRECTIONS.items()}
+# head pictures in the order of SPRITE_FILES
+HEAD_SPRITES = ['up', 'down', 'left', 'right']
+# tail picture by the side of the segment before it
+TAIL_SPRITES = {'down': 4, 'up': 5, 'right': 6, 'left': 7}
+# body picture by the sides of the segments before and after it
+BODY_SPRITES = {}
+for sides, sprite in [(('up', 'down'), 8), (('left', 'right'), 9), (('right', 'up'), 10), (('left', 'up'), 11),
+                      (('right', 'down'), 12), (('left', 'down'), 13)]:
+    BODY_SPRITES[sides] = sprite
+    BODY_SPRITES[sides[::-1]] = sprite
+# pre-rendered grass and rocks, one entry per night mode for the current table
+TABLE_LAYERS = {}
 
 # sets the default difficulty
 DIFFICULTY = 'MEDIUM'
+# seconds between two moves of the snake for every difficulty
+TICK_SECONDS = {
+    'EASY': 0.9,
+    'MEDIUM': 0.6,
+    'HARD': 0.3,
+    'EXTREME': 0.1,
+}
+FRAME_RATE = 60
+# most moves done in one frame to catch up after a stall, the rest of the delay is dropped
+MAX_CATCH_UP = 5
+# slide the head between two cells instead of jumping when a move happens
+INTERPOLATE = False
+# shows the frame times from the start of a game, F toggles them
+PROFILE = bool(os.environ.get("SNAKE_PROFILE"))
+# file the frame times are appended to as JSON lines, the frames are timed when it is set
+METRICS_FILE = os.environ.get("SNAKE_METRICS")
+HUD_COLOUR = (255, 255, 255)
+# milliseconds from the start to the splash frame and to the first menu frame
+STARTUP = {}
+# milliseconds a menu screen sleeps waiting for an event
+MENU_WAIT = 500
+# events after which a menu screen is drawn again, the window was covered or shown again
+REDRAW_EVENTS = (VIDEOEXPOSE, WINDOWEXPOSED, WINDOWSHOWN, WINDOWRESTORED)
 
 
 def play_sound(type_of_sound):
     """
     Callable used to play sound for eating apple or crashing the snake.
     """
-    sound = ""
-    if type_of_sound == 'eat_apple':
-        sound = pygame.mixer.Sound("resource/Minecraft Eating - Sound Effect (HD).mp3")
-    if type_of_sound == 'crash':
-        sound = pygame.mixer.Sound("resource/video game over sound effect.mp3")
-    pygame.mixer.Sound.play(sound)
+    AUDIO.play(type_of_sound)
+
+
+def load_assets():
+    """
+    Callable used to load the pictures once the window exists.
+    """
+    ASSETS.image(BACKGROUND_PICTURE, (SCREEN_WIDTH, SCREEN_HEIGHT), alpha=False)
+    ASSETS.image("resource/apple.png", (SIZE, SIZE))
+    ASSETS.image("resource/rock.png", (SIZE, SIZE))
+    ASSETS.atlas(SPRITE_FILES, SIZE)
+
+
+def configure(arguments):
+    """
+    Callable used to read the table and the replay given on the command line, a replay file ends with .snr.
+    """
+    global REPLAY_FILE, DEFAULT, LEVEL, X, Y
+    tables = [argument for argument in arguments if not argument.endswith(REPLAY_EXTENSION)]
+    replays = [argument for argument in arguments if argument.endswith(REPLAY_EXTENSION)]
+    REPLAY_FILE = replays[0] if replays else None
+    if len(tables) == 1:
+        DEFAULT = 0
+        LEVEL = load_level(tables[0])
+    else:
+        DEFAULT = 1
+        LEVEL = Level()
+    X = LEVEL.x
+    Y = LEVEL.y
+    set_layout(SIZE)
+
+
+def report_startup(stage):
+    """
+    Callable used to record the time since the start when a stage of the startup is reached.
+    The first menu frame ends the startup, the times are then printed and added to the metrics file.
+    """
+    if stage in STARTUP:
+        return
+    STARTUP[stage] = (time.perf_counter() - STARTED) * 1000
+    if stage == 'menu':
+        print(f"startup: splash after {STARTUP.get('splash', 0):.0f} ms, menu after {STARTUP['menu']:.0f} ms",
+              file=sys.stderr)
+        if METRICS_FILE is not None:
+            with open(METRICS_FILE, "a") as f:
+                f.write(json.dumps({"startup_ms": STARTUP, "time": time.time()}) + "\n")
+
+
+def fit_cell_size(width, height):
+    """
+    Callable used to get the largest cell size, up to the size of the pictures, that fits the table on a screen.
+    :rtype: int
+    """
+    if CELL_SIZE:
+        return max(MIN_SIZE, int(CELL_SIZE))
+    if width <= 0 or height <= 0:
+        return SPRITE_SIZE
+    return max(MIN_SIZE, min(SPRITE_SIZE, int(width * SCREEN_FILL) // X, int(height * SCREEN_FILL) // Y))
+
+
+def set_layout(cell_size):
+    """
+    Callable used to change the cell size, the window and the text sizes follow it.
+    """
+    global SIZE, SCREEN_WIDTH, SCREEN_HEIGHT, FONT_SIZE
+    SIZE = cell_size
+    SCREEN_WIDTH = SIZE * X
+    SCREEN_HEIGHT = SIZE * Y
+    FONT_SIZE = max(1, (X + Y) * SIZE // SPRITE_SIZE)
+    TABLE_LAYERS.clear()
+
+
+def load_replay(path):
+    """
+    Callable used to read a replay file and check it was recorded on the current table.
+    :raises ValueError: if the replay is not a replay file or was recorded on another table
+    :raises struct.error: if the replay file is truncated
+    :rtype: Replay
+    """
+    replay = Replay.load(path)
+    if replay.table != LEVEL.hash or (replay.x, replay.y) != (X, Y):
+        raise ValueError("the replay was recorded on another table")
+    return replay
+
+
+def get_leaderboard():
+    """
+    Callable used to get the leaderboard, it is read from the file only once.
+    :rtype: Leaderboard
+    """
+    global LEADERBOARD
+    if LEADERBOARD is None:
+        LEADERBOARD = Leaderboard()
+    return LEADERBOARD
 
 
 def play_background():
     """
-    Callable used to play the background music.
+    Callable used to play the background music, unless it is muted.
     """
-    pygame.mixer.music.load("resource/Theme (30 minutes).mp3")
-    pygame.mixer.music.play()
+    if not MUTED:
+        AUDIO.play_music()
+
+
+def wait_events(timeout=MENU_WAIT):
+    """
+    Callable used by the menu screens to sleep until something happens.
+    :return: list of events, empty when the timeout passed without any
+    :rtype: list
+    """
+    event = pygame.event.wait(timeout)
+    if event.type == NOEVENT:
+        return []
+    return [event] + pygame.event.get()
 
 
 def draw_text(text, size, x_position, y_position, surface):
@@ -61,25 +244,73 @@ def draw_text(text, size, x_position, y_position, surface):
     :return: Rect that has the text
     :rtype: Rect
     """
-    font_name = pygame.font.get_default_font()
-    font = pygame.font.Font(font_name, size)
-    text_surface = font.render(text, True, LETTER_COLOUR)
+    text_surface = ASSETS.text(text, size, LETTER_COLOUR)
     text_rect = text_surface.get_rect()
     text_rect.center = (x_position, y_position)
     surface.blit(text_surface, text_rect)
     return text_rect
 
 
-def is_collision(x1, y1, x2, y2):
+def read_obstacles():
+    """
+    Callable used to get the obstacle cells from the file given as argument.
+    :return: list of (x, y) cells
+    :rtype: list
+    """
+    return LEVEL.obstacles
+
+
+def draw_grass(surface, night_mode):
+    """
+    Callable used to draw the background and the grass squares of the table.
+    """
+    if not night_mode:
+        surface.fill(BACKGROUND_COLOR)
+        grass_color = GRASS_COLOR
+    else:
+        surface.fill(NIGHT_MODE_BACKGROUND_COLOR)
+        grass_color = NIGHT_MODE_GRASS_COLOR
+    for row in range(Y):
+        for col in range(row % 2, X, 2):
+            pygame.draw.rect(surface, grass_color, pygame.Rect(col * SIZE, row * SIZE, SIZE, SIZE))
+
+
+def cell_rect(cell):
+    """
+    Callable used to get the screen Rect of a table cell.
+    :rtype: Rect
+    """
+    return pygame.Rect(cell[0] * SIZE, cell[1] * SIZE, SIZE, SIZE)
+
+
+def table_layer(night_mode, rock):
+    """
+    Callable used to get the grass and the rocks rendered once per table.
+    The layer is rendered again only when the rocks change.
+    :rtype: Surface
+    """
+    table_key = (id(rock), rock.number_of_rocks, SCREEN_WIDTH, SCREEN_HEIGHT)
+    cached = TABLE_LAYERS.get(night_mode)
+    if cached is None or cached[0] != table_key:
+        layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        draw_grass(layer, night_mode)
+        rock.draw_on(layer)
+        cached = (table_key, layer)
+        TABLE_LAYERS[night_mode] = cached
+    return cached[1]
+
+
+def draw_table(surface, night_mode, rock):
+    """
+    Callable used to draw the grass and the rocks.
+    """
+    surface.blit(table_layer(night_mode, rock), (0, 0))
+
+
+class GameOver(Exception):
     """
-    Callable used to test if two points collide.
-    :return: True or False if they collide or not
-    :rtype: Boolean
+    Class used to end the game loop when the snake crashed.
     """
-    if x2 <= x1 < x2 + SIZE:
-        if y2 <= y1 < y2 + SIZE:
-            return True
-    return False
 
 
 class Rock:
@@ -88,7 +319,7 @@ class Rock:
     """
 
     def __init__(self, surface):
-        self.image = pygame.image.load("resource/rock.png")
+        self.image = ASSETS.image("resource/rock.png", (SIZE, SIZE))
         self.parent_screen = surface
         self.x = []
         self.y = []
@@ -102,233 +333,230 @@ class Rock:
         self.y.append(y)
         self.number_of_rocks += 1
 
-    def draw(self):
+    def draw_on(self, surface):
         """
-        Callable used to print the obstacles on the screen
+        Callable used to print the obstacles on the given surface.
         """
-        for i in range(self.number_of_rocks):
-            self.parent_screen.blit(self.image, (self.x[i], self.y[i]))
-        pygame.display.flip()
+        surface.blits([(self.image, position) for position in zip(self.x, self.y)], False)
 
 
 class Apple:
     """
-    Class used to create the apple logic.
+    Class used to draw the apple, the position is kept by the game state.
     """
 
-    def __init__(self, surface, snake, rock):
-        self.image = pygame.image.load("resource/apple.png")
+    def __init__(self, surface, state):
+        self.image = ASSETS.image("resource/apple.png", (SIZE, SIZE))
         self.parent_screen = surface
-        self.snake = snake
-        self.rock = rock
-        self.obstacle_matrix = numpy.zeros((X, Y))
-        self.add_rocks_to_matrix()
-        self.x, self.y = self.generate_apple()
+        self.state = state
 
-    def generate_apple(self):
-        """
-        Callable used to generate the apple x and y depending on the obstacle matrix.
-        """
-        free_space = []
-        for i in range(X):
-            for j in range(Y):
-                if self.obstacle_matrix[i][j] == 0:
-                    free_space.append([i, j])
-        random_apple_spot = random.randint(1, len(free_space) - 1)
-        return free_space[random_apple_spot][0] * SIZE, free_space[random_apple_spot][1] * SIZE
+    @property
+    def x(self):
+        return self.state.apple[0] * SIZE
 
-    def add_rocks_to_matrix(self):
-        """
-        Callable used to add the obstacle positions to the obstacle matrix.
-        """
-        for i in range(self.rock.number_of_rocks):
-            if self.rock.x[i] / SIZE < X and self.rock.y[i] / SIZE < Y:
-                self.obstacle_matrix[int(self.rock.x[i] / SIZE)][int(self.rock.y[i] / SIZE)] = 1
+    @property
+    def y(self):
+        return self.state.apple[1] * SIZE
 
     def draw(self):
         """
         Callable used to draw the apple.
+        :return: Rect of the apple or None if there is no free cell left for it
+        :rtype: Rect
         """
-        self.parent_screen.blit(self.image, (self.x, self.y))
-        pygame.display.flip()
-
-    def move(self):
-        """
-        Callable used to generate a new position for the apple without it being on top of the snake or obstacle.
-        """
-        self.obstacle_matrix = numpy.zeros((X, Y))
-        self.add_rocks_to_matrix()
-        for i in range(self.snake.length):
-            self.obstacle_matrix[int(self.snake.x[i] / SIZE)][int(self.snake.y[i] / SIZE)] = 1
-        self.x, self.y = self.generate_apple()
+        if self.state.apple is not None:
+            return self.parent_screen.blit(self.image, (self.x, self.y))
+        return None
 
 
 class Snake:
     """
-    Class used to create the Snake logic.
+    Class used to draw the snake, the body is kept by the game state.
     """
 
-    def __init__(self, surface, length):
-        self.length = length
+    def __init__(self, surface, state, rock):
         self.parent_screen = surface
-        self.x = [SIZE] * length
-        self.y = [SIZE] * length
-        self.direction = 'down'
+        self.state = state
+        self.rock = rock
         if not NIGHT_MODE:
             self.night_mode = False
         else:
             self.night_mode = True
 
-        self.head_up = pygame.image.load('Graphics/head_up.png').convert_alpha()
-        self.head_down = pygame.image.load('Graphics/head_down.png').convert_alpha()
-        self.head_right = pygame.image.load('Graphics/head_right.png').convert_alpha()
-        self.head_left = pygame.image.load('Graphics/head_left.png').convert_alpha()
+        self.atlas, areas = ASSETS.atlas(SPRITE_FILES, SIZE)
+        # pictures by the direction of the head, of the segment before the tail
+        # and of the segments before and after a body segment
+        self.heads = {direction: areas[SPRITE_FILES[i]] for i, direction in enumerate(HEAD_SPRITES)}
+        self.tails = {side: areas[SPRITE_FILES[i]] for side, i in TAIL_SPRITES.items()}
+        self.bodies = {sides: areas[SPRITE_FILES[i]] for sides, i in BODY_SPRITES.items()}
 
-        self.tail_up = pygame.image.load('Graphics/tail_up.png').convert_alpha()
-        self.tail_down = pygame.image.load('Graphics/tail_down.png').convert_alpha()
-        self.tail_right = pygame.image.load('Graphics/tail_right.png').convert_alpha()
-        self.tail_left = pygame.image.load('Graphics/tail_left.png').convert_alpha()
+    @property
+    def length(self):
+        return self.state.length
 
-        self.body_vertical = pygame.image.load('Graphics/body_vertical.png').convert_alpha()
-        self.body_horizontal = pygame.image.load('Graphics/body_horizontal.png').convert_alpha()
+    @property
+    def direction(self):
+        return self.state.direction
 
-        self.body_tr = pygame.image.load('Graphics/body_tr.png').convert_alpha()
-        self.body_tl = pygame.image.load('Graphics/body_tl.png').convert_alpha()
-        self.body_br = pygame.image.load('Graphics/body_br.png').convert_alpha()
-        self.body_bl = pygame.image.load('Graphics/body_bl.png').convert_alpha()
+    @property
+    def x(self):
+        return [cell[0] * SIZE for cell in self.state.body]
 
-    def draw_grass(self):
+    @property
+    def y(self):
+        return [cell[1] * SIZE for cell in self.state.body]
+
+    def segment_area(self, i):
         """
-        Callable used to draw the grass to the table.
+        Callable used to look up the picture of a segment in the atlas from the sides its neighbours are on.
+        :return: area of the picture in the atlas or None if the segment is hidden under the one behind it
+        :rtype: Rect
         """
-        for row in range(SCREEN_WIDTH):
-            if row % 2 == 0:
-                for col in range(SCREEN_HEIGHT):
-                    if col % 2 == 0:
-                        grass_rect = pygame.Rect(col * SIZE, row * SIZE, SIZE, SIZE)
-                        if not self.night_mode:
-                            pygame.draw.rect(self.parent_screen, GRASS_COLOR, grass_rect)
-                        else:
-                            pygame.draw.rect(self.parent_screen, NIGHT_MODE_GRASS_COLOR, grass_rect)
-            else:
-                for col in range(SCREEN_HEIGHT):
-                    if col % 2 != 0:
-                        grass_rect = pygame.Rect(col * SIZE, row * SIZE, SIZE, SIZE)
-                        if not self.night_mode:
-                            pygame.draw.rect(self.parent_screen, GRASS_COLOR, grass_rect)
-                        else:
-                            pygame.draw.rect(self.parent_screen, NIGHT_MODE_GRASS_COLOR, grass_rect)
-
-    def draw(self):
+        if i == 0:
+            return self.heads.get(self.direction)
+        body = self.state.body
+        x, y = body[i]
+        if i == len(body) - 1:
+            # after eating the new tail sits on top of the previous segment
+            if body[i - 1] == body[i] and i > 1:
+                i -= 1
+            previous_x, previous_y = body[i - 1]
+            return self.tails.get(SIDES.get((previous_x - x, previous_y - y)))
+        previous_x, previous_y = body[i - 1]
+        next_x, next_y = body[i + 1]
+        return self.bodies.get((SIDES.get((previous_x - x, previous_y - y)), SIDES.get((next_x - x, next_y - y))))
+
+    def segment_areas(self):
         """
-        Callable used to draw the snake and table.
+        Callable used to look up the pictures of every segment in one pass over the body.
+        :return: list of areas in the atlas, None for the hidden segments
+        :rtype: list
         """
-        if not self.night_mode:
-            self.parent_screen.fill(BACKGROUND_COLOR)
-        else:
-            self.parent_screen.fill(NIGHT_MODE_BACKGROUND_COLOR)
-        self.draw_grass()
-        for i in range(self.length):
-            if i == 0:
-                if self.direction == 'right':
-                    self.parent_screen.blit(self.head_right, (self.x[i], self.y[i]))
-                elif self.direction == 'left':
-                    self.parent_screen.blit(self.head_left, (self.x[i], self.y[i]))
-                elif self.direction == 'up':
-                    self.parent_screen.blit(self.head_up, (self.x[i], self.y[i]))
-                elif self.direction == 'down':
-                    self.parent_screen.blit(self.head_down, (self.x[i], self.y[i]))
-            elif i == self.length - 1:
-                if self.x[i] < self.x[i - 1]:
-                    self.parent_screen.blit(self.tail_left, (self.x[i], self.y[i]))
-                elif self.x[i] > self.x[i - 1]:
-                    self.parent_screen.blit(self.tail_right, (self.x[i], self.y[i]))
-                elif self.y[i] < self.y[i - 1]:
-                    self.parent_screen.blit(self.tail_up, (self.x[i], self.y[i]))
-                elif self.y[i] > self.y[i - 1]:
-                    self.parent_screen.blit(self.tail_down, (self.x[i], self.y[i]))
-            else:
-                if (self.x[i + 1] > self.x[i] > self.x[i - 1] or self.x[i + 1] < self.x[i] < self.x[i - 1]) and \
-                        self.y[i] == self.y[i + 1] == self.y[i - 1]:
-                    self.parent_screen.blit(self.body_horizontal, (self.x[i], self.y[i]))
-                elif (self.y[i + 1] > self.y[i] > self.y[i - 1] or self.y[i + 1] < self.y[i] < self.y[i - 1]) and \
-                        self.x[i] == self.x[i + 1] == self.x[i - 1]:
-                    self.parent_screen.blit(self.body_vertical, (self.x[i], self.y[i]))
-                elif (self.x[i] < self.x[i + 1] and self.x[i] == self.x[i - 1]
-                      and self.y[i] == self.y[i + 1] and self.y[i] < self.y[i - 1]) \
-                        or (self.x[i] < self.x[i - 1] and self.x[i] == self.x[i + 1]
-                            and self.y[i] == self.y[i - 1] and self.y[i] < self.y[i + 1]):
-                    self.parent_screen.blit(self.body_br, (self.x[i], self.y[i]))
-                elif (self.x[i] > self.x[i + 1] and self.x[i] == self.x[i - 1]
-                      and self.y[i] == self.y[i + 1] and self.y[i] > self.y[i - 1]) \
-                        or (self.x[i] > self.x[i - 1] and self.x[i] == self.x[i + 1]
-                            and self.y[i] == self.y[i - 1] and self.y[i] > self.y[i + 1]):
-                    self.parent_screen.blit(self.body_tl, (self.x[i], self.y[i]))
-                elif (self.x[i] < self.x[i + 1] and self.x[i] == self.x[i - 1]
-                      and self.y[i] == self.y[i + 1] and self.y[i] > self.y[i - 1]) \
-                        or (self.x[i] < self.x[i - 1] and self.x[i] == self.x[i + 1]
-                            and self.y[i] == self.y[i - 1] and self.y[i] > self.y[i + 1]):
-                    self.parent_screen.blit(self.body_tr, (self.x[i], self.y[i]))
-                elif (self.x[i] > self.x[i + 1] and self.x[i] == self.x[i - 1]
-                      and self.y[i] == self.y[i + 1] and self.y[i] < self.y[i - 1]) \
-                        or (self.x[i] > self.x[i - 1] and self.x[i] == self.x[i + 1]
-                            and self.y[i] == self.y[i - 1] and self.y[i] < self.y[i + 1]):
-                    self.parent_screen.blit(self.body_bl, (self.x[i], self.y[i]))
-        pygame.display.flip()
+        cells = list(self.state.body)
+        if not cells:
+            return []
+        # side of the segment before and after every segment
+        before = [None] + [SIDES.get((previous[0] - cell[0], previous[1] - cell[1]))
+                           for previous, cell in zip(cells, cells[1:])]
+        after = [SIDES.get((following[0] - cell[0], following[1] - cell[1]))
+                 for cell, following in zip(cells, cells[1:])] + [None]
+        bodies = self.bodies
+        areas = [bodies.get(sides) for sides in zip(before, after)]
+        areas[0] = self.heads.get(self.direction)
+        if len(cells) > 1:
+            areas[-1] = self.segment_area(len(cells) - 1)
+        return areas
+
+    def draw_segments(self, indices):
+        """
+        Callable used to draw only the given segments of the snake in one batch.
+        :return: list of Rect that were drawn
+        :rtype: list
+        """
+        body = self.state.body
+        blits = []
+        for i in sorted(set(indices), reverse=True):
+            if 0 <= i < self.length:
+                area = self.segment_area(i)
+                if area is not None:
+                    blits.append((self.atlas, cell_rect(body[i]), area))
+        return self.parent_screen.blits(blits)
+
+    def clear_cell(self, cell):
+        """
+        Callable used to draw the table back over one cell.
+        :return: Rect of the cell
+        :rtype: Rect
+        """
+        rect = cell_rect(cell)
+        self.parent_screen.blit(table_layer(self.night_mode, self.rock), rect, rect)
+        return rect
 
-    def increase_length(self):
+    def draw(self):
         """
-        Callable used to increase the length of the snake.
+        Callable used to draw the snake and table.
         """
-        self.length += 1
-        self.x.append(-1)
-        self.y.append(-1)
+        draw_table(self.parent_screen, self.night_mode, self.rock)
+        atlas = self.atlas
+        blits = [(atlas, (cell[0] * SIZE, cell[1] * SIZE), area)
+                 for cell, area in zip(self.state.body, self.segment_areas()) if area is not None]
+        # the head is drawn last, on top of the segments behind it
+        blits.reverse()
+        self.parent_screen.blits(blits, False)
 
     def move_left(self):
         """
         Callable used to change the direction of the snake to left.
         """
-        if self.direction != 'right':
-            self.direction = 'left'
+        self.state.turn('left')
 
     def move_right(self):
         """
         Callable used to change the direction of the snake to right.
         """
-        if self.direction != 'left':
-            self.direction = 'right'
+        self.state.turn('right')
 
     def move_up(self):
         """
         Callable used to change the direction of the snake to up.
         """
-        if self.direction != 'down':
-            self.direction = 'up'
+        self.state.turn('up')
 
     def move_down(self):
         """
         Callable used to change the direction of the snake to down.
         """
-        if self.direction != 'up':
-            self.direction = 'down'
+        self.state.turn('down')
 
     def walk(self):
         """
         Callable used to make the appearance of snake walking.
         """
-        for i in range(self.length - 1, 0, -1):
-            self.x[i] = self.x[i - 1]
-            self.y[i] = self.y[i - 1]
-
-        if self.direction == 'up':
-            self.y[0] -= SIZE
-        if self.direction == 'down':
-            self.y[0] += SIZE
-        if self.direction == 'right':
-            self.x[0] += SIZE
-        if self.direction == 'left':
-            self.x[0] -= SIZE
+        self.state.walk()
         self.draw()
+        pygame.display.flip()
+
+
+class GameClock:
+    """
+    Class used to move the snake at a fixed rate no matter how long a frame takes.
+    Every frame adds its duration to an accumulator and a tick is done for every full tick duration in it.
+    """
+
+    def __init__(self, tick_seconds, frame_rate=FRAME_RATE, max_catch_up=MAX_CATCH_UP):
+        self.clock = pygame.time.Clock()
+        self.tick_seconds = tick_seconds
+        self.frame_rate = frame_rate
+        self.max_catch_up = max_catch_up
+        self.accumulator = 0.0
+
+    def reset(self):
+        """
+        Callable used to forget the time passed, used after a pause.
+        """
+        self.clock.tick()
+        self.accumulator = 0.0
+
+    def frame(self):
+        """
+        Callable used to wait for the next frame.
+        :return: the number of ticks to do in this frame
+        :rtype: int
+        """
+        self.accumulator += self.clock.tick(self.frame_rate) / 1000
+        ticks = int(self.accumulator // self.tick_seconds)
+        if ticks > self.max_catch_up:
+            ticks = self.max_catch_up
+            self.accumulator = self.tick_seconds * ticks
+        self.accumulator -= self.tick_seconds * ticks
+        return ticks
+
+    @property
+    def alpha(self):
+        """
+        How far the game is between the last tick and the next one, from 0 to 1.
+        """
+        return self.accumulator / self.tick_seconds
 
 
 class Play:
@@ -339,19 +567,42 @@ class Play:
     def __init__(self, surface):
         self.surface = surface
         self.click = False
-        self.snake = Snake(self.surface, 2)
-        self.snake.draw()
+        self.difficulty = DIFFICULTY
+        self.seed = random.getrandbits(63)
+        self.state = GameState(X, Y, seed=self.seed, level=LEVEL)
+        self.recorder = Recorder(self.seed, LEVEL.hash, self.difficulty, X, Y)
         self.rock = Rock(self.surface)
         self.read_rocks_from_file()
-        self.apple = Apple(self.surface, self.snake, self.rock)
-        self.apple.draw()
+        self.snake = Snake(self.surface, self.state, self.rock)
+        self.apple = Apple(self.surface, self.state)
+        self.inputs = InputBuffer()
+        # plays instead of the player when set, toggled with P
+        self.autopilot = None
+        # set when the autopilot played any part of the game, its score is then kept off the leaderboard
+        self.assisted = False
+        self.score_rect = pygame.Rect(0, 0, 0, 0)
+        # times the phases of every frame, does nothing unless enabled
+        self.profiler = FrameProfiler(METRICS_FILE) if PROFILE or METRICS_FILE else NullProfiler()
+        self.hud = PROFILE
+        self.hud_rect = pygame.Rect(0, 0, 0, 0)
+        self.hud_summary = None
+        # the whole window is drawn again on the next tick when this is set
+        self.redraw = False
+        self.draw_frame()
 
     def reset(self):
         """
         Callable used to reset the game.
         """
-        self.snake = Snake(self.surface, 2)
-        self.apple = Apple(self.surface, self.snake, self.rock)
+        self.save_replay()
+        self.seed = random.getrandbits(63)
+        self.recorder = Recorder(self.seed, LEVEL.hash, self.difficulty, X, Y)
+        self.state.reset(self.seed)
+        self.snake = Snake(self.surface, self.state, self.rock)
+        self.apple = Apple(self.surface, self.state)
+        self.inputs.clear()
+        self.assisted = self.autopilot is not None
+        self.redraw = True
 
     def run(self):
         """
@@ -360,7 +611,11 @@ class Play:
         global MUTED, NIGHT_MODE
         loop = True
         pause = False
+        clock = GameClock(TICK_SECONDS[DIFFICULTY])
+        profiler = self.profiler
+        profiler.start()
         while loop:
+            profiler.end_frame()
             self.click = False
             for event in pygame.event.get():
                 if event.type == MOUSEBUTTONDOWN:
@@ -371,10 +626,21 @@ class Play:
                         if not pause:
                             if not MUTED:
                                 MUTED = True
-                                pygame.mixer.music.stop()
+                                AUDIO.pause_music()
                             else:
                                 MUTED = False
-                                pygame.mixer.music.play()
+                                AUDIO.play_music()
+                    if event.key == K_f:
+                        self.hud = not self.hud
+                        if self.hud and not self.profiler.enabled:
+                            self.profiler = profiler = FrameProfiler(METRICS_FILE)
+                            profiler.start()
+                    if event.key == K_p:
+                        if self.autopilot is None:
+                            self.autopilot = Autopilot(self.state)
+                            self.assisted = True
+                        else:
+                            self.autopilot = None
                     if event.key == K_n:
                         if not NIGHT_MODE:
                             NIGHT_MODE = True
@@ -382,102 +648,183 @@ class Play:
                         else:
                             NIGHT_MODE = False
                             self.snake.night_mode = False
+                        self.redraw = True
                     if event.key == K_ESCAPE:
                         self.reset()
-                        pygame.mixer.music.stop()
+                        AUDIO.stop_music()
                         return
                     if event.key == K_RETURN:
                         if pause:
                             if not MUTED:
-                                pygame.mixer.music.play()
+                                AUDIO.play_music()
+                            clock.reset()
                         pause = False
                     if not pause:
                         if event.key == K_UP:
-                            self.snake.move_up()
+                            self.inputs.push('up')
                         if event.key == K_DOWN:
-                            self.snake.move_down()
+                            self.inputs.push('down')
                         if event.key == K_LEFT:
-                            self.snake.move_left()
+                            self.inputs.push('left')
                         if event.key == K_RIGHT:
-                            self.snake.move_right()
+                            self.inputs.push('right')
                 elif event.type == QUIT:
                     exit()
+            profiler.mark('events')
+            ticks = clock.frame()
+            profiler.mark('sleep')
+            if pause:
+                continue
+            rects = []
             try:
-                if not pause:
-                    self.play()
-            except Exception as e:
+                for i in range(ticks):
+                    rects += self.play()
+            except GameOver:
                 self.show_game_over()
-                pause = True
+                # the autopilot starts a new game by itself
+                pause = self.autopilot is None
                 self.reset()
-            if DIFFICULTY == 'MEDIUM':
-                time.sleep(0.6)
-            elif DIFFICULTY == 'HARD':
-                time.sleep(0.3)
-            elif DIFFICULTY == 'EXTREME':
-                time.sleep(0.1)
-            else:
-                time.sleep(0.9)
+                continue
+            if INTERPOLATE:
+                rects += self.draw_interpolated(clock.alpha)
+                profiler.mark('draw_interpolated')
+            if self.hud or self.hud_rect:
+                rects += self.draw_hud(rects)
+                profiler.mark('draw_hud')
+            if rects:
+                pygame.display.update(rects)
+                profiler.mark('flip')
+
+    def save_replay(self):
+        """
+        Callable used to write the replay of the current game to the replays directory.
+        """
+        if self.recorder is None or self.recorder.ticks == 0:
+            return
+        os.makedirs(REPLAY_DIRECTORY, exist_ok=True)
+        self.recorder.save(os.path.join(REPLAY_DIRECTORY, f"{self.seed}{REPLAY_EXTENSION}"), self.state.length)
+
+    def set_state(self, state):
+        """
+        Callable used to draw another game state, the whole window is drawn again on the next frame.
+        """
+        self.state = state
+        self.snake.state = state
+        self.apple.state = state
+        self.redraw = True
+
+    def watch(self, replay):
+        """
+        Callable used to play back a replay.
+        Left and right arrows seek, Enter pauses and Escape goes back, the replay is read with load_replay.
+        """
+        self.recorder = None
+        self.difficulty = replay.difficulty
+        self.set_state(replay.new_state(read_obstacles()))
+        clock = GameClock(TICK_SECONDS[replay.difficulty])
+        tick = 0
+        pause = False
+        while True:
+            target = tick
+            for event in pygame.event.get():
+                if event.type == KEYDOWN:
+                    if event.key == K_ESCAPE:
+                        return
+                    if event.key == K_RETURN:
+                        pause = not pause
+                        clock.reset()
+                    if event.key == K_LEFT:
+                        target = max(0, target - SEEK_TICKS)
+                    if event.key == K_RIGHT:
+                        target = min(replay.ticks, target + SEEK_TICKS)
+                elif event.type == QUIT:
+                    exit()
+            if target < tick:
+                self.set_state(replay.seek(target, read_obstacles()))
+            elif target > tick:
+                replay.play(self.state, tick, target)
+                self.redraw = True
+            tick = target
+            if self.redraw:
+                self.redraw = False
+                self.draw_frame()
+
+            ticks = clock.frame()
+            if pause:
+                continue
+            rects = []
+            for i in range(min(ticks, replay.ticks - tick)):
+                try:
+                    rects += self.play(replay.direction(tick))
+                except GameOver:
+                    pause = True
+                tick += 1
+            if rects:
+                pygame.display.update(rects)
 
     def read_rocks_from_file(self):
         """
         Callable used to read the obstacles from json.
         """
         if DEFAULT == 0:
-            for i in range(len(data["obstacle_list"])):
-                self.rock.add_rock(data["obstacle_list"][i][0] * SIZE, data["obstacle_list"][i][1] * SIZE)
-            self.rock.draw()
+            for rock_x, rock_y in read_obstacles():
+                self.rock.add_rock(rock_x * SIZE, rock_y * SIZE)
 
     def show_game_over(self):
         """
         Callable used to create the game over screen.
         """
-        global CURRENT_HIGH_SCORE
+        leaderboard = get_leaderboard()
+        table = LEVEL.hash.hex()[:16]
+        high_score = leaderboard.high_score(self.difficulty, table)
+        score = self.score()
+        if not self.assisted:
+            leaderboard.add(PLAYER_NAME, score, self.difficulty, table)
         # create background
         self.surface.fill("white")
-        background_picture = pygame.image.load("resource/snake_background.png")
-        background_picture = pygame.transform.scale(background_picture, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        background_picture = ASSETS.image(BACKGROUND_PICTURE, (SCREEN_WIDTH, SCREEN_HEIGHT), alpha=False)
         self.surface.blit(background_picture, (0, 0))
 
-        draw_text(f"Play is over! Your score is: {self.snake.length}", FONT_SIZE, SCREEN_WIDTH / 2, FONT_SIZE * 4,
-                  self.surface)
+        draw_text(f"Play is over! Your score is: {score} (x{SCORE_MULTIPLIERS[self.difficulty]})", FONT_SIZE,
+                  SCREEN_WIDTH / 2, FONT_SIZE * 4, self.surface)
 
-        if CURRENT_HIGH_SCORE < self.snake.length:
-            CURRENT_HIGH_SCORE = self.snake.length
-            draw_text(f"You've beaten your HighScore!!!", FONT_SIZE, SCREEN_WIDTH / 2,
+        if self.assisted:
+            draw_text("The autopilot played, the score is not kept.", FONT_SIZE, SCREEN_WIDTH / 2,
+                      SCREEN_HEIGHT / 2 - FONT_SIZE * 2, self.surface)
+        elif high_score < score:
+            draw_text("New best on this table and difficulty!!!", FONT_SIZE, SCREEN_WIDTH / 2,
                       SCREEN_HEIGHT / 2 - FONT_SIZE * 2, self.surface)
         else:
-            draw_text(f"Your current HighScore is {CURRENT_HIGH_SCORE}", FONT_SIZE, SCREEN_WIDTH / 2,
+            draw_text(f"Best on this table and difficulty: {high_score}", FONT_SIZE, SCREEN_WIDTH / 2,
                       SCREEN_HEIGHT / 2 - FONT_SIZE * 2, self.surface)
 
-        draw_text(f"To play again press Enter.", FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, self.surface)
-        draw_text(f"To exit press Escape.", FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2,
+        draw_text("To play again press Enter.", FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, self.surface)
+        draw_text("To exit press Escape.", FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2,
                   self.surface)
 
         pygame.display.flip()
 
-        pygame.mixer.music.stop()
+        AUDIO.stop_music()
+
+    def score(self):
+        """
+        Callable used to compute the score depending on the difficulty.
+        :rtype: int
+        """
+        return compute_score(self.snake.length, self.difficulty)
 
     def display_score(self):
         """
         Callable used to display the score on the bottom right of the screen.
+        :return: Rect that has the score box
+        :rtype: Rect
         """
-        # set the font
-        font = pygame.font.SysFont('roboto', FONT_SIZE)
-        score = font.render(f"1", True, "red")
-        if self.snake.length > 2:
-            if DIFFICULTY == 'EASY':
-                score = font.render(f"{self.snake.length - 1}", True, "red")
-            elif DIFFICULTY == 'MEDIUM':
-                score = font.render(f"{(self.snake.length - 1) * 2}", True, "red")
-            elif DIFFICULTY == 'HARD':
-                score = font.render(f"{(self.snake.length - 1) * 3}", True, "red")
-            elif DIFFICULTY == 'EXTREME':
-                score = font.render(f"{(self.snake.length - 1) * 5}", True, "red")
-        score_x = int(SCREEN_WIDTH - SIZE + 5)
+        score = ASSETS.text(f"{self.score()}", FONT_SIZE, "red", 'roboto')
+        score_x = int(SCREEN_WIDTH - SIZE + SIZE // 8)
         score_y = int(SCREEN_HEIGHT - SIZE)
         score_rect = score.get_rect(center=(score_x, score_y))
 
-        apple_image = pygame.image.load("resource/apple.png")
+        apple_image = ASSETS.image("resource/apple.png", (SIZE, SIZE))
         apple_rect = apple_image.get_rect(midright=(score_rect.left, score_rect.centery))
 
         # Create the border
@@ -487,42 +834,151 @@ class Play:
 
         self.surface.blit(apple_image, apple_rect)
         self.surface.blit(score, score_rect)
+        return bg_rect.union(score_rect)
 
-    def play(self):
+    def draw_frame(self):
         """
-        Callable used to play the game logic.
+        Callable used to draw the whole window.
         """
-        self.snake.walk()
+        self.snake.draw()
         self.apple.draw()
-        self.rock.draw()
-        self.display_score()
+        self.score_rect = self.display_score()
+        # the HUD was drawn over and is drawn again on the next frame
+        self.hud_summary = None
         pygame.display.flip()
 
-        # snake colliding with apple
-        if is_collision(self.snake.x[0], self.snake.y[0], self.apple.x, self.apple.y):
-            play_sound("eat_apple")
-            self.snake.increase_length()
-            self.apple.move()
-
-        # snake colliding with itself
-        for i in range(3, self.snake.length):
-            if is_collision(self.snake.x[0], self.snake.y[0], self.snake.x[i], self.snake.y[i]):
-                play_sound("crash")
-                raise "Play Over"
-
-        # snake colliding with screen border
-        if self.snake.x[0] < 0 and self.snake.direction == 'left' \
-                or self.snake.x[0] > SCREEN_WIDTH - SIZE and self.snake.direction == 'right' \
-                or self.snake.y[0] < 0 and self.snake.direction == 'up' \
-                or self.snake.y[0] > SCREEN_HEIGHT - SIZE and self.snake.direction == 'down':
-            play_sound("crash")
-            raise "Play Over"
-
-        # snake colliding with rock
-        for i in range(self.rock.number_of_rocks):
-            if is_collision(self.snake.x[0], self.snake.y[0], self.rock.x[i], self.rock.y[i]):
-                play_sound("crash")
-                raise "Play Over"
+    def draw_under(self, area):
+        """
+        Callable used to draw the table, the snake and the apple again inside an area.
+        """
+        # pictures crossing the border of the area are already on the screen outside of it
+        self.surface.set_clip(area)
+        self.surface.blit(table_layer(self.snake.night_mode, self.rock), area, area)
+        under = [i for i, cell in enumerate(self.state.body) if cell_rect(cell).colliderect(area)]
+        self.snake.draw_segments(under)
+        self.apple.draw()
+        self.surface.set_clip(None)
+
+    def draw_score_box(self):
+        """
+        Callable used to draw the score box again together with what is under it.
+        :return: Rect that was drawn
+        :rtype: Rect
+        """
+        area = self.score_rect
+        self.draw_under(area)
+        self.score_rect = self.display_score()
+        return self.score_rect.union(area)
+
+    def draw_hud(self, rects):
+        """
+        Callable used to draw the frame rate, the frame times and the slowest phase in the top left corner.
+        It is drawn again only when a new summary is ready or something was drawn over it.
+        :return: list of Rect to update on the screen
+        :rtype: list
+        """
+        summary = self.profiler.summary
+        if self.hud and summary is self.hud_summary and self.hud_rect.collidelist(rects) == -1:
+            return []
+        area = self.hud_rect
+        self.draw_under(area)
+        self.hud_summary = summary
+        self.hud_rect = pygame.Rect(0, 0, 0, 0)
+        if self.hud and summary is not None:
+            text = ASSETS.text(f"{summary['fps']:.0f} FPS  p50 {summary['frame_p50_ms']:.1f} ms  "
+                               f"p99 {summary['frame_p99_ms']:.1f} ms  slowest {summary['slowest']}",
+                               int(FONT_SIZE / 2), HUD_COLOUR)
+            self.hud_rect = text.get_rect(topleft=(5, 5)).inflate(6, 6)
+            pygame.draw.rect(self.surface, "black", self.hud_rect)
+            self.surface.blit(text, (5, 5))
+        return [area.union(self.hud_rect) if self.hud_rect else area]
+
+    def draw_changes(self, old_tail, old_apple, old_score):
+        """
+        Callable used to draw only the cells that changed in the last tick.
+        :return: list of Rect to update on the screen
+        :rtype: list
+        """
+        body = self.state.body
+        length = self.state.length
+        # the old tail is gone, the head is new and the neck and the tail get a different picture
+        changed = [0, 1, length - 1]
+        rects = [self.snake.clear_cell(old_tail)]
+        for i in set(changed):
+            if 0 <= i < length:
+                rects.append(self.snake.clear_cell(body[i]))
+        self.snake.draw_segments(changed)
+        self.profiler.mark('draw_snake')
+        if self.state.apple != old_apple:
+            apple_rect = self.apple.draw()
+            if apple_rect is not None:
+                rects.append(apple_rect)
+            self.profiler.mark('draw_apple')
+        if self.score() != old_score or self.score_rect.collidelist(rects) != -1:
+            rects.append(self.draw_score_box())
+            self.profiler.mark('draw_score')
+        return rects
+
+    def draw_interpolated(self, alpha):
+        """
+        Callable used to slide the head from the neck towards its cell between two ticks.
+        :return: list of Rect to update on the screen
+        :rtype: list
+        """
+        if self.state.length < 2 or self.redraw:
+            return []
+        head_x, head_y = self.state.body[0]
+        neck_x, neck_y = self.state.body[1]
+        if (head_x, head_y) == (neck_x, neck_y):
+            return []
+        # the head drawn in the previous frame can still cover the segment behind the neck
+        cleared = [self.state.body[i] for i in range(min(3, self.state.length))]
+        rects = [self.snake.clear_cell(cell) for cell in cleared]
+        # right after eating the tail shares its cell with the segment before it
+        if self.state.body[-1] in cleared:
+            self.snake.draw_segments([1, 2, self.state.length - 1])
+        else:
+            self.snake.draw_segments([1, 2])
+        position = ((neck_x + (head_x - neck_x) * alpha) * SIZE, (neck_y + (head_y - neck_y) * alpha) * SIZE)
+        self.surface.blit(self.snake.atlas, position, self.snake.segment_area(0))
+        if self.score_rect.collidelist(rects) != -1:
+            rects.append(self.draw_score_box())
+        return rects
+
+    def play(self, turn=None):
+        """
+        Callable used to play the game logic.
+        :param turn: direction to walk, by default the next turn pressed by the player
+        :return: list of Rect to update on the screen, empty if the whole window was drawn
+        :rtype: list
+        """
+        old_tail = self.state.body[-1]
+        old_apple = self.state.apple
+        old_score = self.score()
+        profiler = self.profiler
+        if turn is None:
+            turn = self.inputs.pop(self.state.direction)
+            if self.autopilot is not None:
+                turn = self.autopilot.next_turn()
+        if turn is not None:
+            self.state.turn(turn)
+        if self.recorder is not None:
+            self.recorder.record(self.state.direction)
+        event = self.state.step()
+        profiler.mark('simulate')
+
+        if event is not None:
+            play_sound(event)
+            profiler.mark('sound')
+        if event == 'crash':
+            raise GameOver()
+
+        if self.redraw:
+            self.redraw = False
+            self.draw_frame()
+            profiler.mark('draw_frame')
+            return []
+        return self.draw_changes(old_tail, old_apple, old_score)
 
 
 class Help:
@@ -534,41 +990,50 @@ class Help:
         self.click = False
         self.surface = surface
 
+    def build(self):
+        """
+        Callable used to render the help screen once.
+        :return: the rendered screen and the Rect of the back button
+        :rtype: tuple
+        """
+        layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        layer.fill(GRASS_COLOR)
+        draw_text('How to play the game:', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 6, layer)
+        draw_text('Arrow keys - to move the snake', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 2,
+                  layer)
+        draw_text('N - to activate night mode', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, layer)
+        draw_text('M - to mute the music', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2, layer)
+        draw_text('ESC - to go back', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 4, layer)
+        draw_text('P - to let the autopilot play', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 6,
+                  layer)
+        draw_text('F - to show the frame times', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 8,
+                  layer)
+        back_button = draw_text('Go back', int(FONT_SIZE / 2), SCREEN_WIDTH / 2 - FONT_SIZE * 8,
+                                SCREEN_HEIGHT - FONT_SIZE, layer)
+        return layer, back_button
+
     def help_screen(self):
         """
         Callable used to display information on the help screen.
         """
-        loop = True
-        while loop:
-
-            self.surface.fill(GRASS_COLOR)
-            draw_text('How to play the game:', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 6,
-                      self.surface)
-            draw_text('W, A, S, D - to move the snake', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 2,
-                      self.surface)
-            draw_text('N - to activate night mode', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, self.surface)
-            draw_text('M - to mute the music', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2,
-                      self.surface)
-            draw_text('ESC - to go back', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 4, self.surface)
-            back_button = draw_text('Go back', int(FONT_SIZE / 2), SCREEN_WIDTH / 2 - FONT_SIZE * 8,
-                                    SCREEN_HEIGHT - FONT_SIZE, self.surface)
-            pygame.display.flip()
-
-            mx, my = pygame.mouse.get_pos()
-
-            if back_button.collidepoint((mx, my)):
-                if self.click is True:
-                    loop = False
-            self.click = False
-            for event in pygame.event.get():
+        layer, back_button = self.build()
+        redraw = True
+        while True:
+            if redraw:
+                self.surface.blit(layer, (0, 0))
+                pygame.display.flip()
+                redraw = False
+            for event in wait_events():
                 if event.type == MOUSEBUTTONDOWN:
-                    if event.button == 1:
-                        self.click = True
+                    if event.button == 1 and back_button.collidepoint(event.pos):
+                        return
                 if event.type == KEYDOWN:
                     if event.key == K_ESCAPE:
-                        loop = False
+                        return
                 if event.type == QUIT:
                     exit()
+                if event.type in REDRAW_EVENTS:
+                    redraw = True
 
 
 class Option:
@@ -635,60 +1100,54 @@ class Option:
                     SCREEN_WIDTH / 2 - FONT_SIZE * 3 - FONT_SIZE / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 4 + FONT_SIZE / 8)
                 return 'EXTREME'
 
+    def build(self):
+        """
+        Callable used to render the option screen without its cursors once.
+        :return: the rendered screen and the Rect of every button by name
+        :rtype: tuple
+        """
+        layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        layer.fill(GRASS_COLOR)
+        draw_text('Select Difficulty:', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 6, layer)
+        buttons = {
+            'EASY': draw_text('EASY', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 2, layer),
+            'MEDIUM': draw_text('MEDIUM', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, layer),
+            'HARD': draw_text('HARD', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2, layer),
+            'EXTREME': draw_text('EXTREME', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 4, layer),
+            'Back': draw_text('Go back', int(FONT_SIZE / 2), SCREEN_WIDTH / 2 - FONT_SIZE * 8,
+                              SCREEN_HEIGHT - FONT_SIZE, layer),
+        }
+        return layer, buttons
+
     def option_screen(self):
         """
         Callable used to display information on the option screen.
+        The screen is drawn again only when a cursor moves.
         """
         global DIFFICULTY
         state = 'EASY'
-        loop = True
         self.cursor_rect_options.center = (
             SCREEN_WIDTH / 2 - FONT_SIZE * 2 - FONT_SIZE / 4, SCREEN_HEIGHT / 2 - FONT_SIZE * 2 - FONT_SIZE / 8)
-        while loop:
-            self.surface.fill(GRASS_COLOR)
-            self.selected_option(DIFFICULTY)
-            self.draw_selected_cursor()
-            self.draw_option_cursor()
-            draw_text('Select Difficulty:', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 6,
-                      self.surface)
-            easy = draw_text('EASY', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 2, self.surface)
-            medium = draw_text('MEDIUM', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, self.surface)
-            hard = draw_text('HARD', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2, self.surface)
-            extreme = draw_text('EXTREME', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 4, self.surface)
-            back_button = draw_text('Go back', int(FONT_SIZE / 2), SCREEN_WIDTH / 2 - FONT_SIZE * 8,
-                                    SCREEN_HEIGHT - FONT_SIZE, self.surface)
-            pygame.display.flip()
-
-            mx, my = pygame.mouse.get_pos()
-
-            if back_button.collidepoint((mx, my)):
-                if self.click is True:
-                    self.click = False
-                    loop = False
-            if easy.collidepoint((mx, my)):
-                state = self.move_cursor_for_options('EASY', 'Mouse')
-                if self.click is True:
-                    self.click = False
-                    DIFFICULTY = 'EASY'
-            if medium.collidepoint((mx, my)):
-                state = self.move_cursor_for_options('MEDIUM', 'Mouse')
-                if self.click is True:
-                    self.click = False
-                    DIFFICULTY = 'MEDIUM'
-            if hard.collidepoint((mx, my)):
-                state = self.move_cursor_for_options('HARD', 'Mouse')
-                if self.click is True:
-                    self.click = False
-                    DIFFICULTY = 'HARD'
-            if extreme.collidepoint((mx, my)):
-                state = self.move_cursor_for_options('EXTREME', 'Mouse')
-                if self.click is True:
-                    self.click = False
-                    DIFFICULTY = 'EXTREME'
-            for event in pygame.event.get():
+        layer, buttons = self.build()
+        redraw = True
+        while True:
+            if redraw:
+                self.surface.blit(layer, (0, 0))
+                self.selected_option(DIFFICULTY)
+                self.draw_selected_cursor()
+                self.draw_option_cursor()
+                pygame.display.flip()
+                redraw = False
+            cursor = self.cursor_rect_options.center
+            for event in wait_events():
                 if event.type == MOUSEBUTTONDOWN:
                     if event.button == 1:
-                        self.click = True
+                        for name, button in buttons.items():
+                            if button.collidepoint(event.pos):
+                                if name == 'Back':
+                                    return
+                                DIFFICULTY = name
+                                redraw = True
                 if event.type == KEYDOWN:
                     if event.key == K_UP:
                         state = self.move_cursor_for_options(state, 'Up')
@@ -696,10 +1155,20 @@ class Option:
                         state = self.move_cursor_for_options(state, 'Down')
                     if event.key == K_RETURN:
                         DIFFICULTY = state
+                        redraw = True
                     if event.key == K_ESCAPE:
-                        loop = False
+                        return
                 if event.type == QUIT:
                     exit()
+                if event.type in REDRAW_EVENTS:
+                    redraw = True
+            # hovering a difficulty moves the cursor to it
+            position = pygame.mouse.get_pos()
+            for name, button in buttons.items():
+                if name != 'Back' and button.collidepoint(position):
+                    state = self.move_cursor_for_options(name, 'Mouse')
+            if self.cursor_rect_options.center != cursor:
+                redraw = True
 
     def draw_option_cursor(self):
         draw_text('*', FONT_SIZE, self.cursor_rect_options.x, self.cursor_rect_options.y, self.surface)
@@ -730,12 +1199,29 @@ class Menu:
     """
 
     def __init__(self):
-        pygame.init()
-        pygame.mixer.init()
+        # only what the first frame needs, the sound starts in the background
+        # and the game pictures are loaded once the menu is idle
+        pygame.display.init()
+        pygame.font.init()
+        AUDIO.start()
+        # before the window exists the display size is the size of the screen
+        info = pygame.display.Info()
+        set_layout(fit_cell_size(info.current_w, info.current_h))
         # this is the game window
         self.surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.splash()
         self.cursor_rect_menu = pygame.Rect(0, 0, 0, 0)
         self.click = False
+        self.assets_loaded = False
+
+    def splash(self):
+        """
+        Callable used to show a loading frame while the menu is prepared.
+        """
+        self.surface.fill(GRASS_COLOR)
+        draw_text('Loading...', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, self.surface)
+        pygame.display.flip()
+        report_startup('splash')
 
     def draw_menu_cursor(self):
         draw_text('*', FONT_SIZE, self.cursor_rect_menu.x, self.cursor_rect_menu.y, self.surface)
@@ -793,80 +1279,99 @@ class Menu:
                     SCREEN_WIDTH / 2 - FONT_SIZE * 2 + 10, SCREEN_HEIGHT / 2 + FONT_SIZE * 2 + FONT_SIZE / 4)
                 return 'Exit'
 
+    def build(self):
+        """
+        Callable used to render the background and the labels of the menu once.
+        :return: the rendered screen and the Rect of every button by name
+        :rtype: tuple
+        """
+        layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        layer.fill("white")
+        layer.blit(ASSETS.image(BACKGROUND_PICTURE, (SCREEN_WIDTH, SCREEN_HEIGHT), alpha=False), (0, 0))
+        buttons = {
+            'Start': draw_text('Start Play', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 4, layer),
+            'Options': draw_text('Options', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 2, layer),
+            'Help': draw_text('Help', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 0, layer),
+            'Exit': draw_text('Exit', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2, layer),
+        }
+        return layer, buttons
+
+    def select(self, state):
+        """
+        Callable used to open the screen of a menu button.
+        """
+        if state == 'Start':
+            play_background()
+            Play(self.surface).run()
+        elif state == 'Options':
+            Option(self.surface).option_screen()
+        elif state == 'Help':
+            Help(self.surface).help_screen()
+        elif state == 'Exit':
+            exit()
+
     def menu(self):
         """
         Callable used to display the menu screen.
+        The screen is drawn again only when the cursor moves or another screen was shown.
         """
         state = 'Start'
         self.cursor_rect_menu.center = (
             SCREEN_WIDTH / 2 - FONT_SIZE * 4, SCREEN_HEIGHT / 2 - FONT_SIZE * 4 + FONT_SIZE / 4)
-
-        loop = True
-        while loop:
-            # set the menu background
-            self.surface.fill("white")
-            background_picture = pygame.image.load("resource/snake_background.png")
-            background_picture = pygame.transform.scale(background_picture, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            self.surface.blit(background_picture, (0, 0))
-            self.draw_menu_cursor()
-
-            # get mouse coordinates
-            mx, my = pygame.mouse.get_pos()
-
-            play_button = draw_text('Start Play', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 4,
-                                    self.surface)
-            options_button = draw_text('Options', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - FONT_SIZE * 2,
-                                       self.surface)
-            help_button = draw_text('Help', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 0, self.surface)
-            exit_button = draw_text('Exit', FONT_SIZE, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + FONT_SIZE * 2,
-                                    self.surface)
-            if play_button.collidepoint((mx, my)):
-                state = self.move_cursor_for_menu('Start', 'Mouse')
-                if self.click is True:
-                    play_background()
-                    Play(self.surface).run()
-            if options_button.collidepoint((mx, my)):
-                state = self.move_cursor_for_menu('Options', 'Mouse')
-                if self.click is True:
-                    self.click = False
-                    Option(self.surface).option_screen()
-            if help_button.collidepoint((mx, my)):
-                state = self.move_cursor_for_menu('Help', 'Mouse')
-                if self.click is True:
-                    self.click = False
-                    Help(self.surface).help_screen()
-            if exit_button.collidepoint((mx, my)):
-                state = self.move_cursor_for_menu('Exit', 'Mouse')
-                if self.click is True:
-                    exit()
-
-            pygame.display.flip()
-            self.click = False
-            for event in pygame.event.get():
+        layer, buttons = self.build()
+        redraw = True
+        while True:
+            if redraw:
+                self.surface.blit(layer, (0, 0))
+                self.draw_menu_cursor()
+                pygame.display.flip()
+                report_startup('menu')
+                redraw = False
+            cursor = self.cursor_rect_menu.center
+            selected = None
+            # the game pictures are loaded right after the first frame unless a key is already waiting
+            events = wait_events() if self.assets_loaded else pygame.event.get()
+            if not events and not self.assets_loaded:
+                load_assets()
+                self.assets_loaded = True
+            for event in events:
                 if event.type == MOUSEBUTTONDOWN:
                     if event.button == 1:
-                        self.click = True
+                        for name, button in buttons.items():
+                            if button.collidepoint(event.pos):
+                                selected = name
                 if event.type == KEYDOWN:
-                    if event.key == K_ESCAPE:
-                        pass
                     if event.key == K_UP:
                         state = self.move_cursor_for_menu(state, 'Up')
                     if event.key == K_DOWN:
                         state = self.move_cursor_for_menu(state, 'Down')
                     if event.key == K_RETURN:
-                        if state == 'Start':
-                            play_background()
-                            Play(self.surface).run()
-                        elif state == 'Options':
-                            Option(self.surface).option_screen()
-                        elif state == 'Help':
-                            Help(self.surface).help_screen()
-                        elif state == 'Exit':
-                            exit()
+                        selected = state
                 elif event.type == QUIT:
                     exit()
+                if event.type in REDRAW_EVENTS:
+                    redraw = True
+            # hovering a button moves the cursor to it
+            position = pygame.mouse.get_pos()
+            for name, button in buttons.items():
+                if button.collidepoint(position):
+                    state = self.move_cursor_for_menu(name, 'Mouse')
+            if self.cursor_rect_menu.center != cursor:
+                redraw = True
+            if selected is not None:
+                self.select(selected)
+                redraw = True
 
 
 if __name__ == '__main__':
+    configure(sys.argv[1:])
     game = Menu()
+    if REPLAY_FILE is not None:
+        try:
+            replay = load_replay(REPLAY_FILE)
+        except (ValueError, struct.error, OSError) as error:
+            # a replay that can't be played is reported and the menu opens instead
+            print(f"cannot play {REPLAY_FILE}: {error}", file=sys.stderr)
+        else:
+            Play(game.surface).watch(replay)
     game.menu()
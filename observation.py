@@ -0,0 +1,165 @@
+import numpy
+
+from engine import DIRECTION_NAMES, GameState, compute_score
+from level import Level
+
+# channels of the observation, followed by one channel for every direction in the order of DIRECTION_NAMES
+BODY, HEAD, APPLE, ROCKS = range(4)
+DIRECTION = 4
+CHANNELS = DIRECTION + len(DIRECTION_NAMES)
+KEEP_DIRECTION = -1
+# reward of the tick the snake crashes, eating gives the score of an apple on the difficulty
+CRASH_REWARD = -1.0
+
+
+class ObservationEncoder:
+    """
+    Class used to keep the game state as channels of a NumPy array allocated once and updated in place.
+    The array has a border as wide as the crop, counted as rocks, so the whole table is a view of it
+    and the crop around the head is copied from it into a second array without looking at the edges.
+    Only the cells the tick touched are written: the old and new head, the old tail and the old and new apple.
+    """
+
+    def __init__(self, state, crop=None, dtype=numpy.float32):
+        self.state = state
+        # cells seen on every side of the head in the crop, no crop when None
+        self.crop_radius = crop
+        self.border = crop or 0
+        border = self.border
+        self.buffer = numpy.zeros((CHANNELS, state.x + 2 * border, state.y + 2 * border), dtype=dtype)
+        self.table = self.buffer[:, border:border + state.x, border:border + state.y]
+        # the crop around the head, copied again on every call so callers can keep the same array
+        self.cropped = None
+        if crop is not None:
+            self.cropped = numpy.zeros((CHANNELS, 2 * crop + 1, 2 * crop + 1), dtype=dtype)
+        self.direction = None
+        self.encode()
+
+    def encode(self):
+        """
+        Callable used to write every channel from the state, used after a reset.
+        """
+        state = self.state
+        self.buffer[:] = 0
+        self.buffer[ROCKS] = 1
+        shape = (state.x, state.y)
+        self.table[ROCKS] = numpy.frombuffer(state.rocks, dtype=numpy.uint8).reshape(shape)
+        self.table[BODY] = numpy.frombuffer(state.occupancy, dtype=numpy.uint8).reshape(shape) > 0
+        if state.is_inside(state.head):
+            self.table[(HEAD,) + state.head] = 1
+        if state.apple is not None:
+            self.table[(APPLE,) + state.apple] = 1
+        self.direction = None
+        self.set_direction()
+
+    def set_direction(self):
+        """
+        Callable used to fill the channel of the direction of the snake, the planes change only on a turn.
+        """
+        if self.direction == self.state.direction:
+            return
+        if self.direction is not None:
+            self.buffer[DIRECTION + DIRECTION_NAMES.index(self.direction)] = 0
+        self.direction = self.state.direction
+        self.buffer[DIRECTION + DIRECTION_NAMES.index(self.direction)] = 1
+
+    def update(self, cells):
+        """
+        Callable used to write the body, head and apple channels of the cells a tick changed.
+        :param cells: cells that may have changed, None and cells outside of the table are skipped
+        """
+        state = self.state
+        table = self.table
+        head = state.head
+        for cell in cells:
+            if cell is None or not state.is_inside(cell):
+                continue
+            table[(BODY,) + cell] = state.occupancy[state.cell_index(cell)] > 0
+            table[(HEAD,) + cell] = cell == head
+            table[(APPLE,) + cell] = cell == state.apple
+        self.set_direction()
+
+    def observation(self):
+        """
+        Callable used to get the channels of the whole table, a view updated in place on every tick.
+        :rtype: numpy.ndarray
+        """
+        return self.table
+
+    def crop(self):
+        """
+        Callable used to get the channels of the square around the head, cells outside of the table are rocks.
+        :return: the same (CHANNELS, 2 * crop + 1, 2 * crop + 1) array on every call, or None without a crop
+        :rtype: numpy.ndarray
+        """
+        if self.crop_radius is None:
+            return None
+        head_x, head_y = self.state.head
+        # a head out of the table after a crash is kept on the border
+        head_x = min(max(head_x, 0), self.state.x - 1)
+        head_y = min(max(head_y, 0), self.state.y - 1)
+        size = 2 * self.crop_radius + 1
+        numpy.copyto(self.cropped, self.buffer[:, head_x:head_x + size, head_y:head_y + size])
+        return self.cropped
+
+
+class SnakeEnv:
+    """
+    Class used to play the game with the reset/step interface of Gym environments.
+    The observation is the whole table, or the crop around the head, and is the same array on every call.
+    Actions are indices of DIRECTION_NAMES, -1 keeps the direction.
+    """
+
+    def __init__(self, level=None, difficulty='MEDIUM', crop=None, max_ticks=None, seed=None,
+                 dtype=numpy.float32, crash_reward=CRASH_REWARD):
+        self.level = level if level is not None else Level()
+        self.difficulty = difficulty
+        self.max_ticks = max_ticks
+        self.crash_reward = crash_reward
+        self.state = GameState(self.level.x, self.level.y, seed=seed, level=self.level)
+        self.encoder = ObservationEncoder(self.state, crop, dtype)
+        self.ticks = 0
+
+    def observe(self):
+        if self.encoder.crop_radius is None:
+            return self.encoder.observation()
+        return self.encoder.crop()
+
+    def info(self, event=None):
+        return {"score": compute_score(self.state.length, self.difficulty), "length": self.state.length,
+                "ticks": self.ticks, "event": event}
+
+    def reset(self, seed=None):
+        """
+        Callable used to start a new game, a seed gives the same game for the same actions.
+        :return: observation and info
+        :rtype: tuple
+        """
+        self.state.reset(seed)
+        self.encoder.encode()
+        self.ticks = 0
+        return self.observe(), self.info()
+
+    def step(self, action):
+        """
+        Callable used to turn the snake and advance the game by one tick.
+        :return: observation, reward, terminated, truncated and info
+        :rtype: tuple
+        """
+        state = self.state
+        if action != KEEP_DIRECTION:
+            state.turn(DIRECTION_NAMES[action])
+        head = state.head
+        tail = state.body[-1]
+        apple = state.apple
+        length = state.length
+        event = state.step()
+        self.ticks += 1
+        self.encoder.update((head, tail, apple, state.head, state.apple))
+        reward = float(compute_score(state.length, self.difficulty) - compute_score(length, self.difficulty))
+        if event == 'crash':
+            reward += self.crash_reward
+        # a full table has no apple left, the game is won
+        terminated = event == 'crash' or state.apple is None
+        truncated = not terminated and self.max_ticks is not None and self.ticks >= self.max_ticks
+        return self.observe(), reward, terminated, truncated, self.info(event)
@@ -0,0 +1,194 @@
+import json
+import math
+import time
+from bisect import bisect_left
+
+# upper edges of the histogram buckets in seconds, from 10 microseconds growing by a tenth up to about 3 seconds
+BUCKETS = [0.00001 * 1.1 ** i for i in range(133)]
+# the HUD summary is computed again after this many seconds
+WINDOW_SECONDS = 1.0
+# a JSON line is appended to the metrics file after this many seconds
+METRICS_SECONDS = 10.0
+# time spent waiting for the next frame, never reported as the slowest phase
+IDLE_PHASE = 'sleep'
+
+
+class Histogram:
+    """
+    Class used to count durations in fixed buckets, adding a duration never allocates memory.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """
+        Callable used to count one duration.
+        """
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        """
+        Callable used to add the counts of another histogram.
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        """
+        Callable used to forget every duration.
+        """
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def percentile(self, p):
+        """
+        Callable used to get the upper edge of the bucket with the given percentile.
+        :rtype: float
+        """
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+def summarize(frames, phases, seconds):
+    """
+    Callable used to get the frame rate and the frame and phase times of a window.
+    :rtype: dict
+    """
+    busy = {name: histogram for name, histogram in phases.items() if name != IDLE_PHASE and histogram.count}
+    return {
+        "seconds": seconds,
+        "frames": frames.count,
+        "fps": frames.count / seconds if seconds > 0 else 0.0,
+        "frame_p50_ms": frames.percentile(50) * 1000,
+        "frame_p99_ms": frames.percentile(99) * 1000,
+        "frame_max_ms": frames.max * 1000,
+        "slowest": max(busy, key=lambda name: busy[name].total) if busy else None,
+        "phases": {
+            name: {
+                "count": histogram.count,
+                "total_ms": histogram.total * 1000,
+                "p50_ms": histogram.percentile(50) * 1000,
+                "p99_ms": histogram.percentile(99) * 1000,
+                "max_ms": histogram.max * 1000,
+            } for name, histogram in phases.items() if histogram.count
+        },
+    }
+
+
+class FrameProfiler:
+    """
+    Class used to time the phases of every frame.
+    Every mark adds the time since the previous mark to the histogram of its phase,
+    the window histograms are summarized for the HUD and added to the ones written to the metrics file.
+    """
+
+    def __init__(self, metrics_path=None, window=WINDOW_SECONDS, metrics_every=METRICS_SECONDS):
+        self.enabled = True
+        self.metrics_path = metrics_path
+        self.window = window
+        self.metrics_every = metrics_every
+        self.frames = Histogram()
+        self.phases = {}
+        self.metrics_frames = Histogram()
+        self.metrics_phases = {}
+        # summary of the last finished window, None before the first one
+        self.summary = None
+        self.start()
+
+    def start(self):
+        """
+        Callable used to start timing from now, used when the game loop starts.
+        """
+        now = time.perf_counter()
+        self.last = now
+        self.frame_start = now
+        self.window_start = now
+        self.metrics_start = now
+
+    def mark(self, phase):
+        """
+        Callable used to end a phase, it lasted since the previous mark.
+        """
+        now = time.perf_counter()
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.add(now - self.last)
+        self.last = now
+
+    def end_frame(self):
+        """
+        Callable used to end a frame, the window is summarized when it is over.
+        """
+        now = time.perf_counter()
+        self.frames.add(now - self.frame_start)
+        self.frame_start = now
+        self.last = now
+        if now - self.window_start >= self.window:
+            self.close_window(now)
+
+    def close_window(self, now):
+        """
+        Callable used to summarize the window and start a new one.
+        """
+        self.summary = summarize(self.frames, self.phases, now - self.window_start)
+        self.metrics_frames.merge(self.frames)
+        for phase, histogram in self.phases.items():
+            self.metrics_phases.setdefault(phase, Histogram()).merge(histogram)
+            histogram.reset()
+        self.frames.reset()
+        self.window_start = now
+        if self.metrics_path is not None and now - self.metrics_start >= self.metrics_every:
+            self.export(now)
+
+    def export(self, now):
+        """
+        Callable used to append the summary since the last export to the metrics file as one JSON line.
+        """
+        line = summarize(self.metrics_frames, self.metrics_phases, now - self.metrics_start)
+        line["time"] = time.time()
+        with open(self.metrics_path, "a") as f:
+            f.write(json.dumps(line) + "\n")
+        self.metrics_frames.reset()
+        for histogram in self.metrics_phases.values():
+            histogram.reset()
+        self.metrics_start = now
+
+
+class NullProfiler:
+    """
+    Class used in place of the profiler when it is disabled, every call does nothing.
+    """
+
+    enabled = False
+    summary = None
+
+    def start(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
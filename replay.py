@@ -0,0 +1,179 @@
+import hashlib
+import struct
+import sys
+import time
+
+from engine import DIRECTION_NAMES, GameState
+from level import load_level
+
+MAGIC = b'SNKR'
+VERSION = 1
+# magic, version, seed, table hash, difficulty, x, y, ticks, final length
+HEADER = struct.Struct('<4sBQ32sBHHII')
+DIFFICULTIES = ['EASY', 'MEDIUM', 'HARD', 'EXTREME']
+REPLAY_EXTENSION = '.snr'
+# every tick is stored as the index of the direction walked, four ticks per byte
+TICKS_PER_BYTE = 4
+
+
+def table_hash(table):
+    """
+    Callable used to hash the bytes of a table json, an empty table is used when there is no file.
+    :rtype: bytes
+    """
+    return hashlib.sha256(table).digest()
+
+
+class Recorder:
+    """
+    Class used to record the direction walked on every tick of a game.
+    """
+
+    def __init__(self, seed, table, difficulty, x, y):
+        self.seed = seed
+        self.table = table
+        self.difficulty = difficulty
+        self.x = x
+        self.y = y
+        self.ticks = 0
+        self.packed = bytearray()
+
+    def record(self, direction):
+        """
+        Callable used to add the direction walked in one tick.
+        """
+        shift = (self.ticks % TICKS_PER_BYTE) * 2
+        if shift == 0:
+            self.packed.append(0)
+        self.packed[-1] |= DIRECTION_NAMES.index(direction) << shift
+        self.ticks += 1
+
+    def to_bytes(self, length):
+        """
+        Callable used to get the binary log of the game.
+        :param length: length of the snake at the end, used to check the replay
+        :rtype: bytes
+        """
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.table, DIFFICULTIES.index(self.difficulty),
+                             self.x, self.y, self.ticks, length)
+        return header + bytes(self.packed)
+
+    def save(self, path, length):
+        """
+        Callable used to write the binary log of the game to a file.
+        """
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes(length))
+
+
+class Replay:
+    """
+    Class used to read a recorded game and simulate it again without rendering.
+    """
+
+    def __init__(self, seed, table, difficulty, x, y, ticks, length, packed):
+        self.seed = seed
+        self.table = table
+        self.difficulty = difficulty
+        self.x = x
+        self.y = y
+        self.ticks = ticks
+        self.length = length
+        self.packed = packed
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Callable used to read a replay from its binary log.
+        :rtype: Replay
+        """
+        magic, version, seed, table, difficulty, x, y, ticks, length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a replay file')
+        packed = bytes(data[HEADER.size:])
+        if len(packed) * TICKS_PER_BYTE < ticks:
+            raise ValueError('replay file is truncated')
+        return cls(seed, table, DIFFICULTIES[difficulty], x, y, ticks, length, packed)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Callable used to read a replay file.
+        :rtype: Replay
+        """
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def direction(self, tick):
+        """
+        Callable used to get the direction walked on the given tick.
+        :rtype: str
+        """
+        shift = (tick % TICKS_PER_BYTE) * 2
+        return DIRECTION_NAMES[(self.packed[tick // TICKS_PER_BYTE] >> shift) & 3]
+
+    def new_state(self, obstacles=()):
+        """
+        Callable used to create the game the replay starts from.
+        :rtype: GameState
+        """
+        state = GameState(self.x, self.y, obstacles)
+        state.reset(self.seed)
+        return state
+
+    def play(self, state, start, stop):
+        """
+        Callable used to simulate the ticks from start to stop on the given game.
+        :return: the event of the last simulated tick
+        :rtype: str
+        """
+        event = None
+        for tick in range(start, min(stop, self.ticks)):
+            state.turn(self.direction(tick))
+            event = state.step()
+        return event
+
+    def seek(self, tick, obstacles=()):
+        """
+        Callable used to get the game as it was after the given number of ticks.
+        :rtype: GameState
+        """
+        state = self.new_state(obstacles)
+        self.play(state, 0, tick)
+        return state
+
+    def verify(self, obstacles=(), digest=None):
+        """
+        Callable used to simulate the whole game and check it ends like it was recorded.
+        :param digest: hash of the table, checked against the recorded one when given
+        :return: True if the table and the final length match
+        :rtype: bool
+        """
+        if digest is not None and digest != self.table:
+            return False
+        state = self.seek(self.ticks, obstacles)
+        return state.length == self.length
+
+
+def main(arguments):
+    """
+    Callable used to check replay files from the command line: replay.py file.snr [table.json]
+    """
+    replay = Replay.load(arguments[0])
+    obstacles = []
+    digest = table_hash(b'')
+    if len(arguments) > 1:
+        level = load_level(arguments[1], replay.x, replay.y)
+        obstacles = level.obstacles
+        digest = level.hash
+    start = time.perf_counter()
+    valid = replay.verify(obstacles, digest)
+    seconds = time.perf_counter() - start
+    print(f"{arguments[0]}: {replay.difficulty} {replay.x}x{replay.y}, {replay.ticks} ticks, "
+          f"length {replay.length}, {'valid' if valid else 'INVALID'}, "
+          f"{replay.ticks / max(seconds, 1e-9):.0f} ticks per second")
+    return 0 if valid else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy
+
+from autopilot import Autopilot
+from engine import DIRECTION_NAMES, SCORE_MULTIPLIERS, GameState, compute_score
+from level import Level, load_level
+
+POLICIES = ['autopilot', 'random']
+# columns of the shared result array, the score of every difficulty comes from the length
+LENGTH, TICKS, SECONDS, DONE = range(4)
+COLUMNS = 4
+CHUNK_SIZE = 16
+MAX_TICKS = 100000
+# the checkpoint is written at most this often while games finish, and once more at the end
+CHECKPOINT_SECONDS = 30.0
+# levels already read by a worker process
+LEVELS = {}
+
+
+def get_level(path):
+    """
+    Callable used to read a level once per process, None is the empty 20x20 table.
+    :rtype: Level
+    """
+    if path not in LEVELS:
+        LEVELS[path] = Level() if path is None else load_level(path)
+    return LEVELS[path]
+
+
+def run_game(level, seed, policy, max_ticks):
+    """
+    Callable used to play one game without rendering.
+    The difficulty only changes the speed of the game on the screen, so one game gives the score of every difficulty.
+    :return: length of the snake and number of ticks survived
+    :rtype: tuple
+    """
+    state = GameState(level.x, level.y, seed=seed, level=level)
+    if policy == 'autopilot':
+        # without a time budget the moves never depend on the speed or the load of the machine
+        pilot = Autopilot(state, budget=float('inf'))
+        choose = pilot.next_turn
+    else:
+        rng = random.Random(seed)
+
+        def choose():
+            return rng.choice(DIRECTION_NAMES)
+    ticks = 0
+    while ticks < max_ticks and state.apple is not None:
+        state.turn(choose())
+        ticks += 1
+        if state.step() == 'crash':
+            break
+    return state.length, ticks
+
+
+def run_chunk(memory_name, number_of_jobs, jobs, config):
+    """
+    Callable used by the worker processes to play a chunk of games and write them in the shared result array.
+    :param jobs: list of (index, table, seed)
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        results = numpy.ndarray((number_of_jobs, COLUMNS), dtype=numpy.float64, buffer=memory.buf)
+        for index, table, seed in jobs:
+            start = time.perf_counter()
+            length, ticks = run_game(get_level(table), seed, config["policy"], config["max_ticks"])
+            results[index, LENGTH] = length
+            results[index, TICKS] = ticks
+            results[index, SECONDS] = time.perf_counter() - start
+            results[index, DONE] = 1
+        del results
+    finally:
+        memory.close()
+    return len(jobs)
+
+
+def make_jobs(tables, seeds):
+    """
+    Callable used to list every game of the tournament, one per table and seed.
+    :return: list of (index, table, seed)
+    :rtype: list
+    """
+    jobs = []
+    for table in tables:
+        for seed in seeds:
+            jobs.append((len(jobs), table, seed))
+    return jobs
+
+
+def config_key(config):
+    """
+    Callable used to identify a tournament, a checkpoint is used only by the same tournament.
+    :rtype: str
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def load_checkpoint(path, key, results):
+    """
+    Callable used to copy the finished games of a checkpoint into the results.
+    :return: number of finished games
+    :rtype: int
+    """
+    if path is None or not os.path.exists(path):
+        return 0
+    with numpy.load(path) as checkpoint:
+        if str(checkpoint["key"]) != key or checkpoint["results"].shape != results.shape:
+            return 0
+        results[:] = checkpoint["results"]
+    return int(results[:, DONE].sum())
+
+
+def save_checkpoint(path, key, results):
+    """
+    Callable used to write the results to a temporary file and move it over the old checkpoint.
+    """
+    if path is None:
+        return
+    temporary = path + ".tmp.npz"
+    numpy.savez(temporary, key=key, results=results)
+    os.replace(temporary, path)
+
+
+def summarize(jobs, results, difficulties, seconds):
+    """
+    Callable used to get the survival distribution of every table and its score distribution on every difficulty.
+    The survival is the same on every difficulty, the same games are scored with every multiplier.
+    :rtype: dict
+    """
+    groups = {}
+    for index, table, seed in jobs:
+        groups.setdefault(table or "default", []).append(index)
+    summary = {"groups": [], "games": len(jobs), "seconds": seconds,
+               "ticks_per_second": float(results[:, TICKS].sum() / max(results[:, SECONDS].sum(), 1e-9))}
+    for table, indices in groups.items():
+        ticks = results[indices, TICKS]
+        group = {
+            "table": table,
+            "games": len(indices),
+            "survival_mean": float(ticks.mean()),
+            "survival_percentiles": {str(p): float(numpy.percentile(ticks, p)) for p in (10, 50, 90)},
+            "scores": {},
+        }
+        for difficulty in difficulties:
+            scores = numpy.array([compute_score(int(length), difficulty) for length in results[indices, LENGTH]])
+            group["scores"][difficulty] = {
+                "mean": float(scores.mean()),
+                "percentiles": {str(p): float(numpy.percentile(scores, p)) for p in (10, 50, 90)},
+                "max": float(scores.max()),
+            }
+        summary["groups"].append(group)
+    return summary
+
+
+def run_tournament(tables, difficulties, seeds, policy, workers=None, chunk_size=CHUNK_SIZE,
+                   max_ticks=MAX_TICKS, checkpoint=None, checkpoint_seconds=CHECKPOINT_SECONDS):
+    """
+    Callable used to play every game of a tournament over several processes.
+    :return: the summary of the results
+    :rtype: dict
+    """
+    jobs = make_jobs(tables, seeds)
+    # the difficulties only score the games, a checkpoint is used again with other difficulties
+    config = {"tables": tables, "seeds": list(seeds), "policy": policy, "max_ticks": max_ticks}
+    key = config_key(config)
+    memory = shared_memory.SharedMemory(create=True, size=max(len(jobs), 1) * COLUMNS * 8)
+    try:
+        results = numpy.ndarray((len(jobs), COLUMNS), dtype=numpy.float64, buffer=memory.buf)
+        results[:] = 0
+        load_checkpoint(checkpoint, key, results)
+        todo = [job for job in jobs if not results[job[0], DONE]]
+        chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+        start = time.perf_counter()
+        saved = start
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = {executor.submit(run_chunk, memory.name, len(jobs), chunk, config) for chunk in chunks}
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                    # the whole array is written every time, so it is written only once in a while
+                    if time.perf_counter() - saved >= checkpoint_seconds:
+                        save_checkpoint(checkpoint, key, results)
+                        saved = time.perf_counter()
+        finally:
+            # the games finished so far are kept even when the tournament is interrupted
+            save_checkpoint(checkpoint, key, results)
+        summary = summarize(jobs, results, difficulties, time.perf_counter() - start)
+        del results
+    finally:
+        memory.close()
+        memory.unlink()
+    return summary
+
+
+def main(arguments):
+    """
+    Callable used to run a tournament from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Play many headless games and summarize the scores.")
+    parser.add_argument("tables", nargs="*", help="table json or obstacle files, the empty 20x20 table by default")
+    parser.add_argument("--seeds", type=int, default=100, help="number of games for every table")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--difficulties", nargs="+", default=['MEDIUM'], choices=list(SCORE_MULTIPLIERS),
+                        help="difficulties the games are scored on, the games and survival are the same on all")
+    parser.add_argument("--policy", default='autopilot', choices=POLICIES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--checkpoint", default=None, help="npz file used to resume an interrupted tournament")
+    parser.add_argument("--checkpoint-seconds", type=float, default=CHECKPOINT_SECONDS)
+    parser.add_argument("--output", default=None, help="json file for the summary, printed by default")
+    options = parser.parse_args(arguments)
+    seeds = range(options.first_seed, options.first_seed + options.seeds)
+    summary = run_tournament(options.tables or [None], options.difficulties, seeds, options.policy,
+                             options.workers, options.chunk_size, options.max_ticks, options.checkpoint,
+                             options.checkpoint_seconds)
+    text = json.dumps(summary, indent=2)
+    if options.output is None:
+        print(text)
+    else:
+        with open(options.output, "w") as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))